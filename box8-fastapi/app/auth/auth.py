@@ -1,25 +1,43 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Set
-from fastapi import HTTPException, status, Response, Cookie
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set
+from fastapi import HTTPException, status, Request, Response, Cookie
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from uuid import uuid4
 from passlib.context import CryptContext
 
 from app.models.user import User, UserLogin, UserRegistration
-from app.database.database import get_user_by_email, create_user, check_user_exists
+from app.database.database import get_user_by_email, get_cached_user, create_user, check_user_exists
 
 # Configuration de la sécurité
 SECRET_KEY = "votre_clé_secrète_ici"  # À changer en production
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Part de la durée de vie du token au-delà de laquelle la session est prolongée
+SESSION_RENEW_FRACTION = float(os.getenv("SESSION_RENEW_FRACTION", "0.5"))
 
 # Configuration du hachage de mot de passe
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Nombre de threads dédiés au hachage et à la vérification des mots de passe (bcrypt libère le GIL)
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Nombre maximal d'opérations en cours ou en attente ; au-delà, la requête est refusée (503)
+PASSWORD_QUEUE_MAX = int(os.getenv("PASSWORD_QUEUE_MAX", "32"))
+
+_password_executor = ThreadPoolExecutor(max_workers=max(1, PASSWORD_WORKERS), thread_name_prefix="password")
+# Opérations soumises au pool et non terminées (modifié uniquement depuis la boucle d'événements)
+_password_pending = 0
 
 # Set pour stocker les tokens invalidés
 invalidated_tokens: Set[str] = set()
 
+# Tokens déjà vérifiés : token -> contenu (sub, exp, iat)
+_decoded_tokens: Dict[str, Dict] = {}
+# Nombre maximal de tokens gardés en mémoire
+DECODED_TOKENS_MAX = 4096
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Vérifie si le mot de passe correspond au hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -28,40 +46,123 @@ def get_password_hash(password: str) -> str:
     """Génère un hash pour le mot de passe"""
     return pwd_context.hash(password)
 
+async def _run_password_task(func, *args):
+    """
+    Exécute une opération bcrypt dans le pool dédié, hors de la boucle d'événements.
+
+    Raises:
+        HTTPException: 503 si le nombre d'opérations en attente atteint PASSWORD_QUEUE_MAX
+    """
+    global _password_pending
+    if _password_pending >= PASSWORD_QUEUE_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Serveur surchargé, veuillez réessayer",
+            headers={"Retry-After": "1"}
+        )
+    _password_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_password_executor, func, *args)
+    finally:
+        _password_pending -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Vérifie si le mot de passe correspond au hash, dans le pool dédié"""
+    return await _run_password_task(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Génère un hash pour le mot de passe, dans le pool dédié"""
+    return await _run_password_task(get_password_hash, password)
+
 def get_user(email: str) -> Optional[dict]:
-    """Récupère un utilisateur par son email"""
-    return get_user_by_email(email)
+    """Récupère un utilisateur par son email (cache du processus, voir get_cached_user)"""
+    return get_cached_user(email)
 
-def authenticate_user(email: str, password: str) -> Optional[dict]:
+async def authenticate_user(email: str, password: str) -> Optional[dict]:
     """Authentifie un utilisateur"""
-    user = get_user(email)
+    user = get_user_by_email(email)
     if not user:
         return None
-    if not verify_password(password, user["hashed_password"]):
+    if not await verify_password_async(password, user["hashed_password"]):
         return None
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Crée un token JWT"""
     to_encode = data.copy()
+    now = datetime.now(timezone.utc)
     if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+        expire = now + timedelta(minutes=15)
+    to_encode.update({"exp": expire, "iat": now})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 def invalidate_token(token: str) -> None:
     """Ajoute un token à la blacklist"""
     invalidated_tokens.add(token)
+    _decoded_tokens.pop(token, None)
+
+def decode_token(token: str) -> Dict:
+    """
+    Vérifie un token JWT et retourne son contenu.
+
+    La vérification de signature n'est faite qu'une fois par token : le résultat est
+    gardé jusqu'à l'expiration du token.
+
+    Args:
+        token (str): Token JWT
+
+    Returns:
+        Dict: Contenu du token (sub, exp, iat)
+
+    Raises:
+        JWTError: Si le token est invalide ou expiré
+    """
+    cached = _decoded_tokens.get(token)
+    if cached is not None:
+        if cached["exp"] > datetime.now(timezone.utc).timestamp():
+            return cached
+        _decoded_tokens.pop(token, None)
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    if payload.get("sub") is not None and payload.get("exp") is not None:
+        if len(_decoded_tokens) >= DECODED_TOKENS_MAX:
+            _decoded_tokens.clear()
+        _decoded_tokens[token] = payload
+    return payload
+
+def session_needs_renewal(token: str) -> bool:
+    """
+    Indique si un token de session a dépassé SESSION_RENEW_FRACTION de sa durée de vie.
+
+    Args:
+        token (str): Token JWT
+
+    Returns:
+        bool: True s'il faut émettre un nouveau token (False si le token est invalide)
+    """
+    try:
+        payload = decode_token(token)
+    except JWTError:
+        return False
+    expire = float(payload["exp"])
+    # Tokens émis sans « iat » : durée de vie par défaut
+    issued = float(payload.get("iat") or expire - ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+    lifetime = max(1.0, expire - issued)
+    return datetime.now(timezone.utc).timestamp() - issued >= lifetime * SESSION_RENEW_FRACTION
 
 def is_token_valid(token: str) -> bool:
     """Vérifie si un token est valide (non blacklisté)"""
     return token not in invalidated_tokens
 
-async def get_current_user(session: Optional[str] = Cookie(None)) -> Optional[dict]:
-    """Récupère l'utilisateur actuellement connecté à partir du cookie de session"""
+async def get_current_user(session: Optional[str] = Cookie(None), request: Request = None) -> Optional[dict]:
+    """
+    Récupère l'utilisateur actuellement connecté à partir du cookie de session.
+
+    Si la requête est fournie, l'utilisateur est conservé dans request.state.user pour
+    être réutilisé (prolongation de session) sans nouvelle vérification.
+    """
     if not session:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -76,8 +177,7 @@ async def get_current_user(session: Optional[str] = Cookie(None)) -> Optional[di
         )
 
     try:
-        payload = jwt.decode(session, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
+        email = decode_token(session).get("sub")
         if email is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -96,6 +196,8 @@ async def get_current_user(session: Optional[str] = Cookie(None)) -> Optional[di
                 detail="Compte désactivé"
             )
 
+        if request is not None:
+            request.state.user = user
         return user
     except JWTError:
         raise HTTPException(
@@ -105,7 +207,7 @@ async def get_current_user(session: Optional[str] = Cookie(None)) -> Optional[di
 
 async def login_user(response: Response, user_data: UserLogin):
     """Logique de connexion d'un utilisateur"""
-    user = authenticate_user(user_data.email, user_data.password)
+    user = await authenticate_user(user_data.email, user_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -159,7 +261,7 @@ async def register_user(user_data: UserRegistration):
             detail=error_message
         )
 
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     new_user = {
         "id": str(uuid4()),
         "username": user_data.username,
@@ -1,11 +1,21 @@
 import sqlite3
-from typing import Optional, Tuple
+import threading
+import time
+from typing import Dict, Optional, Tuple
 from contextlib import contextmanager
 import os
 from pathlib import Path
 
 # Chemin vers la base de données
 DATABASE_PATH = Path("users.db").absolute()
+# Durée de conservation en mémoire d'un utilisateur lu en base (secondes, 0 : pas de cache)
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+
+# Utilisateurs lus récemment, par email : (instant de lecture, utilisateur ou None)
+_user_cache: Dict[str, Tuple[float, Optional[dict]]] = {}
+_user_cache_lock = threading.Lock()
+# Incrémenté à chaque invalidation : une lecture concurrente ne remet pas en cache une valeur périmée
+_user_cache_generation = 0
 
 def init_db():
     """Initialise la base de données et crée les tables si elles n'existent pas"""
@@ -52,6 +62,52 @@ def get_user_by_email(email: str) -> Optional[dict]:
         cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
         return cursor.fetchone()
 
+def get_cached_user(email: str) -> Optional[dict]:
+    """
+    Récupère un utilisateur par son email, depuis le cache du processus si possible.
+
+    Le cache est vidé pour un utilisateur à chaque modification faite par ce module
+    (voir invalidate_user_cache) ; la durée USER_CACHE_TTL borne l'écart avec les
+    modifications faites par un autre processus.
+
+    Args:
+        email (str): Email de l'utilisateur
+
+    Returns:
+        Optional[dict]: Copie de l'utilisateur, ou None s'il n'existe pas
+    """
+    now = time.monotonic()
+    with _user_cache_lock:
+        entry = _user_cache.get(email)
+        generation = _user_cache_generation
+    if entry is None or now - entry[0] > USER_CACHE_TTL:
+        entry = (now, get_user_by_email(email))
+        if USER_CACHE_TTL > 0:
+            with _user_cache_lock:
+                if generation == _user_cache_generation:
+                    _user_cache[email] = entry
+    return dict(entry[1]) if entry[1] is not None else None
+
+def invalidate_user_cache(email: Optional[str] = None, user_id: Optional[str] = None) -> None:
+    """
+    Retire un utilisateur du cache (tout le cache si aucun critère n'est donné).
+
+    Args:
+        email (Optional[str]): Email de l'utilisateur
+        user_id (Optional[str]): Identifiant de l'utilisateur
+    """
+    global _user_cache_generation
+    with _user_cache_lock:
+        _user_cache_generation += 1
+        if email is None and user_id is None:
+            _user_cache.clear()
+            return
+        if email is not None:
+            _user_cache.pop(email, None)
+        if user_id is not None:
+            for key in [key for key, (_, user) in _user_cache.items() if user and user['id'] == user_id]:
+                del _user_cache[key]
+
 def get_user_by_username(username: str) -> Optional[dict]:
     """Récupère un utilisateur par son nom d'utilisateur"""
     with get_db() as db:
@@ -98,6 +154,7 @@ def create_user(user_data: dict) -> None:
             print(f"Exécution de la requête: {query} avec params: {params}")  # Log
             cursor.execute(query, params)
             db.commit()
+            invalidate_user_cache(email=user_data['email'])
             print("Utilisateur créé avec succès dans la base de données")  # Log
     except sqlite3.IntegrityError as e:
         print(f"Erreur d'intégrité SQLite: {str(e)}")  # Log
@@ -121,6 +178,7 @@ def update_user(user_id: str, update_data: dict) -> None:
         cursor = db.cursor()
         cursor.execute(query, (*update_fields.values(), user_id))
         db.commit()
+    invalidate_user_cache(email=update_fields.get('email'), user_id=user_id)
 
 def delete_user(user_id: str) -> None:
     """Supprime un utilisateur de la base de données"""
@@ -128,6 +186,7 @@ def delete_user(user_id: str) -> None:
         cursor = db.cursor()
         cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
         db.commit()
+    invalidate_user_cache(user_id=user_id)
 
 def promote_to_admin(email: str) -> bool:
     """Promouvoir un utilisateur au rang d'administrateur"""
@@ -135,7 +194,8 @@ def promote_to_admin(email: str) -> bool:
         cursor = db.cursor()
         cursor.execute('UPDATE users SET is_admin = 1 WHERE email = ?', (email,))
         db.commit()
-        return cursor.rowcount > 0
+    invalidate_user_cache(email=email)
+    return cursor.rowcount > 0
 
 # Initialisation de la base de données au démarrage
 if not os.path.exists(DATABASE_PATH):
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from ..auth.auth import get_current_user
-from ..database.database import get_db, dict_factory, promote_to_admin
+from ..database.database import get_db, dict_factory, promote_to_admin, invalidate_user_cache
 from ..models.user import User
 from typing import List
 
@@ -38,6 +38,7 @@ async def toggle_admin(user_id: str, current_user: dict = Depends(check_admin)):
         new_status = not user[0]
         cursor.execute('UPDATE users SET is_admin = ? WHERE id = ?', (new_status, user_id))
         db.commit()
+        invalidate_user_cache(user_id=user_id)
         return {"status": "success", "is_admin": new_status}
 
 @router.put("/users/{user_id}/toggle-active")
@@ -58,6 +59,7 @@ async def toggle_active(user_id: str, current_user: dict = Depends(check_admin))
         new_status = not user[0]
         cursor.execute('UPDATE users SET is_active = ? WHERE id = ?', (new_status, user_id))
         db.commit()
+        invalidate_user_cache(user_id=user_id)
         return {"status": "success", "is_active": new_status}
 
 @router.delete("/users/{user_id}")
@@ -72,6 +74,7 @@ async def delete_user(user_id: str, current_user: dict = Depends(check_admin)):
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
         db.commit()
+        invalidate_user_cache(user_id=user_id)
         return {"status": "success"}
 
 # Endpoint temporaire pour promouvoir un utilisateur en administrateur
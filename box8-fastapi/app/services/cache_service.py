@@ -0,0 +1,50 @@
+import os
+from typing import Any, Dict, List
+from ..utils.cache_store import DiskCache
+from ..utils.hashing import hash_json
+
+# Cache persistant des résultats de nœuds de diagramme
+NODE_CACHE_PATH = os.getenv("NODE_CACHE_PATH", "cache/node_results.db")
+NODE_CACHE_MAX_BYTES = int(os.getenv("NODE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Version du format de clé : à incrémenter si la façon d'exécuter un nœud change
+NODE_CACHE_VERSION = 1
+
+node_cache = DiskCache(NODE_CACHE_PATH, NODE_CACHE_MAX_BYTES)
+
+def node_input_hash(agent: Any, description: str, expected_output: str, files: List[str]) -> str:
+    """
+    Calcule l'empreinte de l'entrée effective d'un nœud.
+
+    Deux exécutions ayant la même empreinte reçoivent exactement le même prompt
+    (rôle, objectif, backstory assemblée avec les résultats amont, tâche, LLM) et les
+    mêmes documents pour les outils RAG.
+
+    Args:
+        agent (Agent): Agent CrewAI du nœud, backstory déjà assemblée
+        description (str): Description de la tâche exécutée
+        expected_output (str): Sortie attendue de la tâche
+        files (List[str]): Empreintes des fichiers utilisés par les outils du nœud
+
+    Returns:
+        str: Empreinte hexadécimale
+    """
+    llm = agent.llm
+    return hash_json({
+        'version': NODE_CACHE_VERSION,
+        'role': agent.role,
+        'goal': agent.goal,
+        'backstory': agent.backstory,
+        'description': description,
+        'expected_output': expected_output,
+        'llm': {
+            'model': getattr(llm, 'model', str(llm)),
+            'temperature': getattr(llm, 'temperature', None),
+            'base_url': getattr(llm, 'base_url', None)
+        },
+        'files': sorted(files)
+    })
+
+def node_cache_stats() -> Dict:
+    """Retourne les statistiques du cache des résultats de nœuds"""
+    return node_cache.stats()
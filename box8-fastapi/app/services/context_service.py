@@ -0,0 +1,138 @@
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+from ..utils.token_utils import count_tokens, truncate_to_tokens
+
+# Budget de tokens par défaut pour le contexte (backstory) d'un nœud
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+
+OMISSION_MARKER = "[…]"
+
+def _terms(text: str) -> set:
+    """Extrait les termes significatifs (au moins 4 caractères) d'un texte."""
+    return {word for word in re.findall(r"\w+", text.lower()) if len(word) >= 4}
+
+def select_relevant_slices(content: str, max_tokens: int, query: str = "", model: Optional[str] = None) -> str:
+    """
+    Réduit un texte à max_tokens en conservant les paragraphes les plus pertinents.
+
+    Les paragraphes sont classés par recouvrement lexical avec la requête (à défaut,
+    par position) puis restitués dans leur ordre d'origine.
+
+    Args:
+        content (str): Texte à réduire
+        max_tokens (int): Nombre maximal de tokens
+        query (str): Texte décrivant ce que le nœud doit produire
+        model (Optional[str]): Modèle dont le tokenizer est utilisé pour compter
+
+    Returns:
+        str: Texte réduit
+    """
+    if count_tokens(content, model) <= max_tokens:
+        return content
+
+    paragraphs = [p for p in re.split(r"\n\s*\n", content) if p.strip()]
+    query_terms = _terms(query)
+
+    def score(index: int) -> Tuple[int, int]:
+        return (len(_terms(paragraphs[index]) & query_terms), -index)
+
+    # Réserve de quoi insérer les marqueurs d'omission
+    limit = max_tokens - 2 * count_tokens(OMISSION_MARKER, model)
+    selected = []
+    used = 0
+    for index in sorted(range(len(paragraphs)), key=score, reverse=True):
+        cost = count_tokens(paragraphs[index], model) + 1
+        if used + cost > limit:
+            continue
+        selected.append(index)
+        used += cost
+
+    if not selected:
+        return truncate_to_tokens(content, max_tokens - 1, model) + OMISSION_MARKER
+
+    parts = []
+    previous = -1
+    for index in sorted(selected):
+        if index != previous + 1:
+            parts.append(OMISSION_MARKER)
+        parts.append(paragraphs[index])
+        previous = index
+    if previous != len(paragraphs) - 1:
+        parts.append(OMISSION_MARKER)
+    return "\n\n".join(parts)
+
+def assemble_context(backstory: str, sections: List[Tuple[str, str]], budget: int = CONTEXT_TOKEN_BUDGET, query: str = "", model: Optional[str] = None) -> Tuple[str, Dict]:
+    """
+    Construit la backstory d'un nœud à partir de sa backstory propre et des contextes amont.
+
+    Chaque contenu n'est ajouté qu'une seule fois, sous les titres de toutes les sections
+    qui le fournissent. Si le total dépasse le budget, le budget
+    restant est réparti équitablement entre les sections et les plus longues sont réduites
+    à leurs passages les plus pertinents pour la requête.
+
+    Args:
+        backstory (str): Backstory définie dans le diagramme (toujours conservée)
+        sections (List[Tuple[str, str]]): Couples (titre, contenu) à ajouter
+        budget (int): Budget total de tokens pour la backstory
+        query (str): Texte décrivant la tâche du nœud, utilisé pour la pertinence
+        model (Optional[str]): Modèle dont le tokenizer est utilisé pour compter (comme pour
+            le découpage des documents)
+
+    Returns:
+        Tuple[str, Dict]: Backstory assemblée et rapport d'utilisation du budget
+    """
+    # Un contenu identique fourni par plusieurs sections n'est ajouté qu'une fois,
+    # sous les titres de toutes ces sections
+    unique_sections = []
+    seen = {}
+    for title, content in sections:
+        content = (content or "").strip()
+        if not content:
+            continue
+        if content in seen:
+            index = seen[content]
+            titles, _ = unique_sections[index]
+            if title not in titles:
+                titles.append(title)
+            continue
+        seen[content] = len(unique_sections)
+        unique_sections.append(([title], content))
+    unique_sections = [(" / ".join(titles), content) for titles, content in unique_sections]
+
+    headers_tokens = sum(count_tokens(f"\n\n{title} :\n", model) for title, _ in unique_sections)
+    available = max(0, budget - count_tokens(backstory, model) - headers_tokens)
+
+    # Répartition équitable : les petites sections sont conservées entières,
+    # le reste du budget est partagé entre les plus longues
+    sizes = [count_tokens(content, model) for _, content in unique_sections]
+    allowances = {}
+    pending = sorted(range(len(unique_sections)), key=lambda i: sizes[i])
+    while pending:
+        share = available // len(pending)
+        index = pending[0]
+        size = sizes[index]
+        if size <= share:
+            allowances[index] = size
+            available -= size
+            pending.pop(0)
+        else:
+            for index in pending:
+                allowances[index] = share
+            pending = []
+
+    truncated = []
+    assembled = backstory
+    for index, (title, content) in enumerate(unique_sections):
+        if sizes[index] > allowances[index]:
+            content = select_relevant_slices(content, allowances[index], query, model)
+            truncated.append(title)
+        assembled += f"\n\n{title} :\n{content}"
+
+    report = {
+        'context_tokens': count_tokens(assembled, model),
+        'context_budget': budget,
+        'sections': len(unique_sections),
+        'truncated': truncated
+    }
+    return assembled, report
@@ -0,0 +1,154 @@
+import copy
+import json
+from typing import Dict, List, Tuple
+from .diagram_validator import normalize_diagram
+
+# Champs d'un nœud modifiables par un patch (la clé et le type sont fixes)
+NODE_FIELDS = {"role", "goal", "backstory", "tools", "file", "summarize", "rag", "context_budget", "deadline"}
+# Champs d'un lien modifiables par un patch (les extrémités sont fixes)
+LINK_FIELDS = {"description", "expected_output", "relationship", "deadline"}
+
+# Opérations reconnues et paramètres obligatoires de chacune
+OPERATIONS = {
+    "add_node": ("node",),
+    "remove_node": ("key",),
+    "update_node": ("key", "fields"),
+    "add_link": ("link",),
+    "remove_link": ("id",),
+    "update_link": ("id", "fields")
+}
+
+class PatchError(ValueError):
+    """Opération de patch invalide pour le diagramme courant"""
+
+def diagram_outline(diagram: Dict) -> str:
+    """
+    Représentation compacte d'un diagramme, une ligne par nœud et par lien.
+
+    Args:
+        diagram (Dict): Diagramme
+
+    Returns:
+        str: Description textuelle du diagramme
+    """
+    lines = ["Nœuds (clé | type | rôle | objectif) :"]
+    for node in diagram.get("nodes", []):
+        lines.append(f"- {node.get('key')} | {node.get('type', 'agent')} | {node.get('role', '')} | {node.get('goal', '')}")
+    lines.append("Liens (id : source -> cible | tâche | sortie attendue) :")
+    for link in diagram.get("links", []):
+        lines.append(f"- {link.get('id')} : {link.get('from')} -> {link.get('to')} | {link.get('description') or ''} | {link.get('expected_output') or ''}")
+    return "\n".join(lines)
+
+def parse_patch(text: str) -> List[Dict]:
+    """
+    Extrait la liste d'opérations de la réponse d'un LLM.
+
+    Args:
+        text (str): Réponse contenant un tableau JSON (éventuellement dans un bloc ```json)
+
+    Returns:
+        List[Dict]: Opérations
+
+    Raises:
+        PatchError: Si la réponse ne contient pas de liste d'opérations
+    """
+    raw = text.split("```json")[-1].split("```")[0].strip()
+    try:
+        patch = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise PatchError(f"Patch illisible : {e}")
+    if isinstance(patch, dict):
+        patch = patch.get("operations", patch.get("patch"))
+    if not isinstance(patch, list):
+        raise PatchError("Le patch doit être une liste d'opérations")
+    return patch
+
+def _fields(op: Dict, allowed: set) -> Dict:
+    """Champs à modifier d'une opération update_*, limités aux champs autorisés"""
+    fields = op["fields"]
+    if not isinstance(fields, dict) or not fields:
+        raise PatchError("« fields » doit être un objet non vide")
+    unknown = set(fields) - allowed
+    if unknown:
+        raise PatchError(f"Champs non modifiables : {', '.join(sorted(unknown))}")
+    return fields
+
+def _apply_operation(diagram: Dict, op: Dict) -> None:
+    """Applique une opération au diagramme (modifié en place)"""
+    if not isinstance(op, dict) or op.get("op") not in OPERATIONS:
+        raise PatchError(f"Opération inconnue : {op.get('op') if isinstance(op, dict) else op!r}")
+    missing = [param for param in OPERATIONS[op["op"]] if param not in op]
+    if missing:
+        raise PatchError(f"Paramètres manquants : {', '.join(missing)}")
+
+    nodes = {node["key"]: node for node in diagram["nodes"]}
+    links = {link["id"]: link for link in diagram["links"]}
+    kind = op["op"]
+
+    if kind == "add_node":
+        node = op["node"]
+        if not isinstance(node, dict) or not node.get("key"):
+            raise PatchError("Le nœud ajouté doit avoir une clé")
+        if node["key"] in nodes:
+            raise PatchError(f"Le nœud {node['key']} existe déjà")
+        diagram["nodes"].append({**{field: value for field, value in node.items() if field in NODE_FIELDS},
+                                 "key": str(node["key"]), "type": "agent"})
+    elif kind == "remove_node":
+        key = op["key"]
+        if key not in nodes:
+            raise PatchError(f"Nœud inexistant : {key}")
+        if nodes[key].get("type") == "output":
+            raise PatchError("Le nœud de sortie ne peut pas être supprimé")
+        diagram["nodes"] = [node for node in diagram["nodes"] if node["key"] != key]
+        diagram["links"] = [link for link in diagram["links"] if key not in (link["from"], link["to"])]
+    elif kind == "update_node":
+        if op["key"] not in nodes:
+            raise PatchError(f"Nœud inexistant : {op['key']}")
+        nodes[op["key"]].update(_fields(op, NODE_FIELDS))
+    elif kind == "add_link":
+        link = op["link"]
+        if not isinstance(link, dict):
+            raise PatchError("Le lien ajouté doit être un objet")
+        source, target = link.get("from"), link.get("to")
+        if source not in nodes or target not in nodes:
+            raise PatchError(f"Lien {source} -> {target} : nœud inexistant")
+        if any(existing["from"] == source and existing["to"] == target for existing in diagram["links"]):
+            raise PatchError(f"Le lien {source} -> {target} existe déjà")
+        link_id = str(link.get("id") or f"link_{source}_{target}")
+        if link_id in links:
+            raise PatchError(f"L'identifiant de lien {link_id} existe déjà")
+        diagram["links"].append({**{field: value for field, value in link.items() if field in LINK_FIELDS},
+                                 "id": link_id, "from": source, "to": target, "type": "task"})
+    elif kind == "remove_link":
+        if op["id"] not in links:
+            raise PatchError(f"Lien inexistant : {op['id']}")
+        diagram["links"] = [link for link in diagram["links"] if link["id"] != op["id"]]
+    elif kind == "update_link":
+        if op["id"] not in links:
+            raise PatchError(f"Lien inexistant : {op['id']}")
+        links[op["id"]].update(_fields(op, LINK_FIELDS))
+
+def apply_patch(diagram: Dict, patch: List[Dict]) -> Tuple[Dict, List[str]]:
+    """
+    Applique un patch à un diagramme.
+
+    Les opérations sont validées et appliquées dans l'ordre sur une copie du diagramme ;
+    une opération invalide est ignorée et signalée sans annuler les autres. Le résultat
+    est ensuite normalisé (cycles, chemin vers la sortie) par normalize_diagram.
+
+    Args:
+        diagram (Dict): Diagramme d'origine (non modifié)
+        patch (List[Dict]): Opérations ({"op": "add_node" | "remove_node" | "update_node"
+            | "add_link" | "remove_link" | "update_link", ...})
+
+    Returns:
+        Tuple[Dict, List[str]]: Diagramme modifié et liste des opérations ignorées et corrections
+    """
+    result, report = normalize_diagram(copy.deepcopy(diagram))
+    for index, op in enumerate(patch):
+        try:
+            _apply_operation(result, op)
+        except PatchError as e:
+            report.append(f"Opération {index} ignorée : {e}")
+    result, corrections = normalize_diagram(result)
+    return result, report + corrections
@@ -1,11 +1,22 @@
 import os
 import json
-import aiofiles
+import asyncio
 from typing import Dict, List, Optional
 from fastapi import WebSocket
 from crewai import Agent, Crew, Task, Process
-from ..utils.crewai_functions import choose_llm, choose_tool, reset_chroma
-from ..utils.pdf_utils import extract_page_text_from_file
+from ..utils.crewai_functions import choose_llm, choose_tool, get_chunk_token_budget, llm_configs
+from ..utils.pdf_utils import iter_page_text_from_file
+from .scheduler import run_crew, run_dag
+from .context_service import assemble_context, CONTEXT_TOKEN_BUDGET
+from .cache_service import node_cache, node_input_hash
+from .run_history import load_run, save_run, node_signature, dirty_nodes
+from .summary_service import lookup_summary, store_summary, summary_key, import_legacy_summary
+from .diagram_validator import links_to_enrich, normalize_diagram
+from .diagram_patch import PatchError, apply_patch, diagram_outline, parse_patch
+from ..utils.hashing import hash_file
+from ..utils.singleflight import SingleFlight
+from ..utils.hedging import LLM_TASK_DEADLINE, llm_deadline
+from ..utils.token_utils import count_tokens, chunk_texts
 import networkx as nx
 from ..websocket.manager import manager
 
@@ -15,9 +26,26 @@ YELLOW = '\033[33m'
 MAGENTA = '\033[35m'
 END = '\033[0m'
 
+# Nombre maximal de crews de résumé exécutés simultanément pour un document
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "4"))
+# Budget de tokens d'un lot de résumés lors de la réduction hiérarchique (0 : budget du modèle)
+SUMMARY_REDUCE_TOKENS = int(os.getenv("SUMMARY_REDUCE_TOKENS", "0"))
+# Nombre de tokens repris d'un chunk au suivant
+SUMMARY_CHUNK_OVERLAP = int(os.getenv("SUMMARY_CHUNK_OVERLAP", "0"))
+
+# Détail par un LLM des liens vers le nœud output d'un diagramme généré (désactivé par défaut)
+DIAGRAM_LLM_ENRICHMENT = os.getenv("DIAGRAM_LLM_ENRICHMENT", "0") == "1"
+
+# Résumés en cours de génération, partagés entre les appelants simultanés
+summary_flight = SingleFlight()
+
 async def crewai_summarize_if_not_exists(pdf: str, pages: int = 6, history: Optional[str] = None, llm: str = "openai") -> str:
     """
     Récupère ou génère le résumé d'un document PDF de manière asynchrone.
+
+    Le résumé est recherché par empreinte du contenu, LLM et paramètres de résumé :
+    un fichier modifié est résumé à nouveau, un fichier identique n'est résumé qu'une fois.
+    À défaut, un ancien fichier <document>.txt à jour est repris dans le stockage.
     
     Args:
         pdf (str): Chemin vers le fichier PDF
@@ -28,17 +56,161 @@ async def crewai_summarize_if_not_exists(pdf: str, pages: int = 6, history: Opti
     Returns:
         str: Résumé du document
     """
-    txt_path = f"{pdf}.txt"
-    if os.path.exists(txt_path):
-        try:
-            async with aiofiles.open(txt_path, "r", encoding="utf-8") as file:
-                return await file.read()
-        except Exception as e:
-            print(f"Erreur lors de la lecture du fichier : {e}")
-            return await crewai_summarize(pdf, pages=pages, history=history, llm=llm)
+    doc_hash = await asyncio.to_thread(hash_file, pdf)
+    summary = await asyncio.to_thread(lookup_summary, doc_hash, _summary_params(llm, pages))
+    if summary is None:
+        summary = await asyncio.to_thread(import_legacy_summary, pdf, doc_hash)
+    if summary is not None:
+        return summary
+    print(f"Aucun résumé de {pdf} pour ces paramètres, on le génère.")
+    return await crewai_summarize(pdf, pages=pages, history=history, llm=llm)
+
+def _summary_params(llm: str, pages: int) -> Dict:
+    """Paramètres déterminant le contenu d'un résumé, utilisés dans la clé du stockage"""
+    return {
+        'llm': llm,
+        'model': llm_configs.get(llm, {}).get("model"),
+        'pages': pages if pages > 0 else -1,
+        'chunk_tokens': get_chunk_token_budget(llm),
+        'chunk_overlap': SUMMARY_CHUNK_OVERLAP,
+        'reduce_tokens': SUMMARY_REDUCE_TOKENS
+    }
+
+def _batch_summaries(summaries: List[str], max_tokens: int, model: Optional[str] = None) -> List[List[str]]:
+    """
+    Regroupe des résumés consécutifs en lots dont la taille tient dans max_tokens.
+
+    Chaque lot contient au moins deux résumés pour garantir que la réduction progresse.
+
+    Args:
+        summaries (List[str]): Résumés à regrouper, dans l'ordre du document
+        max_tokens (int): Budget de tokens d'un lot
+        model (Optional[str]): Modèle dont le tokenizer est utilisé pour compter
+
+    Returns:
+        List[List[str]]: Lots de résumés
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+    for summary in summaries:
+        tokens = count_tokens(summary, model)
+        if len(current) >= 2 and current_tokens + tokens > max_tokens:
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(summary)
+        current_tokens += tokens
+    if current:
+        if len(current) == 1 and batches:
+            batches[-1].extend(current)
+        else:
+            batches.append(current)
+    return batches
+
+async def _summarize_chunk(chunk_idx: int, chunk: str, llm: str) -> str:
+    """
+    Résume une partie d'un document avec un crew de deux agents.
+
+    Args:
+        chunk_idx (int): Index de la partie dans le document
+        chunk (str): Texte de la partie
+        llm (str): Modèle de langage à utiliser
+
+    Returns:
+        str: Résumé de la partie
+    """
+    # Définition des agents pour ce chunk
+    agents = {
+        "title_extractor": Agent(
+            name=f"Extracteur de Titres - Partie {chunk_idx + 1}",
+            role="Expert en identification de titres",
+            goal="Identifier les titres et thèmes principaux de cette section",
+            backstory="Un spécialiste dans l'identification rapide de titres et de sujets principaux.",
+            llm=choose_llm(llm)
+        ),
+        "content_analyzer": Agent(
+            name=f"Analyseur de Contenu - Partie {chunk_idx + 1}",
+            role="Expert en analyse de contenu",
+            goal="Analyser et résumer le contenu de cette section",
+            backstory="Un expert en analyse et synthèse de texte, capable d'extraire les informations essentielles.",
+            llm=choose_llm(llm)
+        )
+    }
+
+    # Définition des tâches pour ce chunk
+    tasks = [
+        Task(
+            name=f"Analyse des Titres - Partie {chunk_idx + 1}",
+            agent=agents["title_extractor"],
+            description=f"Identifie les titres et thèmes principaux de cette section:\n{chunk}",
+            expected_output="Les titres et thèmes principaux en français."
+        ),
+        Task(
+            name=f"Analyse du Contenu - Partie {chunk_idx + 1}",
+            agent=agents["content_analyzer"],
+            description=f"Analyse et résume cette section du document:\n{chunk}",
+            expected_output="Un résumé structuré en français avec les informations clés au format markdown."
+        )
+    ]
+
+    # Création et exécution du crew pour ce chunk
+    crew = Crew(
+        agents=list(agents.values()),
+        tasks=tasks,
+        process=Process.sequential
+    )
+
+    result = await run_crew(crew)
+    return result.raw
+
+async def _synthesize_summaries(summaries: List[str], llm: str, final: bool = True, label: str = "") -> str:
+    """
+    Combine plusieurs résumés en une synthèse.
+
+    Args:
+        summaries (List[str]): Résumés à combiner, dans l'ordre du document
+        llm (str): Modèle de langage à utiliser
+        final (bool): True pour la synthèse finale, False pour une synthèse intermédiaire
+        label (str): Libellé de la synthèse intermédiaire
+
+    Returns:
+        str: Synthèse obtenue
+    """
+    if final:
+        name = "Synthétiseur Final"
+        task_name = "Synthèse Finale"
+        goal = "Créer une synthèse cohérente de l'ensemble du document"
+        expected_output = "Une synthèse globale structurée en français au format markdown, incluant les points clés de chaque section."
     else:
-        print(f"Le fichier {pdf} n'existe pas, on le génère.")
-        return await crewai_summarize(pdf, pages=pages, history=history, llm=llm)
+        name = f"Synthétiseur Intermédiaire - {label}"
+        task_name = f"Synthèse Intermédiaire - {label}"
+        goal = "Créer une synthèse cohérente d'une suite de sections du document"
+        expected_output = "Une synthèse structurée en français au format markdown, conservant les points clés de chaque section dans l'ordre."
+
+    synthesizer = Agent(
+        name=name,
+        role="Expert en synthèse globale",
+        goal=goal,
+        backstory="Un expert en synthèse capable de combiner plusieurs résumés en un ensemble cohérent.",
+        llm=choose_llm(llm)
+    )
+
+    task = Task(
+        name=task_name,
+        agent=synthesizer,
+        description=f"Crée une synthèse cohérente à partir des résumés suivants:{chr(10)}{chr(10).join(['---'] + summaries)}",
+        expected_output=expected_output
+    )
+
+    crew = Crew(
+        agents=[synthesizer],
+        tasks=[task],
+        process=Process.sequential
+    )
+
+    result = await run_crew(crew)
+    return result.raw
 
 async def crewai_summarize(pdf: str, pages: int = -1, history: Optional[str] = None, llm: str = "openai") -> str:
     """
@@ -53,110 +225,58 @@ async def crewai_summarize(pdf: str, pages: int = -1, history: Optional[str] = N
     Returns:
         str: Résumé généré par CrewAI
     """
-    # Extraction du texte de toutes les pages
-    all_pages = await extract_page_text_from_file(src=pdf)
-    
-    # Détermination du nombre de pages à traiter
-    if pages <= 0:
-        pages = len(all_pages)
-    else:
-        pages = min(pages, len(all_pages))
-    
-    # Estimation approximative des tokens (environ 200 tokens par page en moyenne)
-    tokens_per_chunk = 2000  # Limite conservative pour éviter les dépassements
-    pages_per_chunk = max(1, tokens_per_chunk // 200)
+    # Les demandes simultanées pour un même contenu et les mêmes paramètres
+    # partagent une seule génération
+    doc_hash = await asyncio.to_thread(hash_file, pdf)
+    params = _summary_params(llm, pages)
+    return await summary_flight.do(
+        summary_key(doc_hash, params),
+        lambda: _generate_summary(pdf, pages, llm, doc_hash, params)
+    )
+
+async def _generate_summary(pdf: str, pages: int, llm: str, doc_hash: str, params: Dict) -> str:
+    """Génère le résumé d'un document et l'enregistre dans le stockage des résumés"""
+    # Lecture des pages au fil de l'extraction, arrêtée dès que le nombre de pages demandé est atteint
+    selected_pages = []
+    async for page in iter_page_text_from_file(pdf, max_pages=pages if pages > 0 else None):
+        selected_pages.append(page)
     
-    # Traitement par chunks
-    chunks = []
-    for i in range(0, pages, pages_per_chunk):
-        end_idx = min(i + pages_per_chunk, pages)
-        chunk_pages = all_pages[i:end_idx]
-        chunk_text = "\n".join(chunk_pages)
-        chunks.append(chunk_text)
+    # Découpage en chunks selon le nombre réel de tokens, dans le budget du modèle
+    tokens_per_chunk = get_chunk_token_budget(llm)
+    model = llm_configs.get(llm, {}).get("model")
+    chunks = chunk_texts(selected_pages, tokens_per_chunk, overlap_tokens=SUMMARY_CHUNK_OVERLAP, model=model)
     
-    # Traitement de chaque chunk
-    chunk_summaries = []
-    for chunk_idx, chunk in enumerate(chunks):
-        # Définition des agents pour ce chunk
-        agents = {
-            "title_extractor": Agent(
-                name=f"Extracteur de Titres - Partie {chunk_idx + 1}",
-                role="Expert en identification de titres",
-                goal="Identifier les titres et thèmes principaux de cette section",
-                backstory="Un spécialiste dans l'identification rapide de titres et de sujets principaux.",
-                llm=choose_llm(llm)
-            ),
-            "content_analyzer": Agent(
-                name=f"Analyseur de Contenu - Partie {chunk_idx + 1}",
-                role="Expert en analyse de contenu",
-                goal="Analyser et résumer le contenu de cette section",
-                backstory="Un expert en analyse et synthèse de texte, capable d'extraire les informations essentielles.",
-                llm=choose_llm(llm)
-            )
-        }
-
-        # Définition des tâches pour ce chunk
-        tasks = [
-            Task(
-                name=f"Analyse des Titres - Partie {chunk_idx + 1}",
-                agent=agents["title_extractor"],
-                description=f"Identifie les titres et thèmes principaux de cette section:\n{chunk}",
-                expected_output="Les titres et thèmes principaux en français."
-            ),
-            Task(
-                name=f"Analyse du Contenu - Partie {chunk_idx + 1}",
-                agent=agents["content_analyzer"],
-                description=f"Analyse et résume cette section du document:\n{chunk}",
-                expected_output="Un résumé structuré en français avec les informations clés au format markdown."
-            )
-        ]
-
-        # Création et exécution du crew pour ce chunk
-        crew = Crew(
-            agents=list(agents.values()),
-            tasks=tasks,
-            process=Process.sequential
-        )
-
-        result = await crew.kickoff_async()
-        chunk_summaries.append(result.raw)
-
-    # Si nous avons plusieurs chunks, créons un résumé final
-    if len(chunk_summaries) > 1:
-        final_agents = {
-            "synthesizer": Agent(
-                name="Synthétiseur Final",
-                role="Expert en synthèse globale",
-                goal="Créer une synthèse cohérente de l'ensemble du document",
-                backstory="Un expert en synthèse capable de combiner plusieurs résumés en un ensemble cohérent.",
-                llm=choose_llm(llm)
-            )
-        }
-
-        final_tasks = [
-            Task(
-                name="Synthèse Finale",
-                agent=final_agents["synthesizer"],
-                description=f"Crée une synthèse cohérente à partir des résumés suivants:{chr(10)}{chr(10).join(['---'] + chunk_summaries)}",
-                expected_output="Une synthèse globale structurée en français au format markdown, incluant les points clés de chaque section."
-            )
-        ]
-
-        final_crew = Crew(
-            agents=list(final_agents.values()),
-            tasks=final_tasks,
-            process=Process.sequential
-        )
-
-        final_result = await final_crew.kickoff_async()
-        result_str = final_result.raw
-    else:
-        result_str = chunk_summaries[0]
-
-    # Sauvegarde du résultat
-    txt_path = f"{pdf}.txt"
-    async with aiofiles.open(txt_path, "w", encoding="utf-8") as file:
-        await file.write(result_str)
+    # Traitement des chunks en parallèle (l'ordre des résumés est conservé)
+    semaphore = asyncio.Semaphore(max(1, SUMMARY_MAX_CONCURRENCY))
+
+    async def summarize_chunk(chunk_idx: int, chunk: str) -> str:
+        async with semaphore:
+            return await _summarize_chunk(chunk_idx, chunk, llm)
+
+    chunk_summaries = list(await asyncio.gather(*[
+        summarize_chunk(chunk_idx, chunk) for chunk_idx, chunk in enumerate(chunks)
+    ]))
+
+    # Réduction hiérarchique : les résumés sont synthétisés par lots tenant dans le
+    # budget de contexte, jusqu'à n'en garder qu'un seul
+    level = 0
+    while len(chunk_summaries) > 1:
+        level += 1
+        batches = _batch_summaries(chunk_summaries, SUMMARY_REDUCE_TOKENS or tokens_per_chunk, model)
+        final = len(batches) == 1
+
+        async def reduce_batch(batch_idx: int, batch: List[str]) -> str:
+            async with semaphore:
+                return await _synthesize_summaries(batch, llm, final=final, label=f"Niveau {level} - Lot {batch_idx + 1}")
+
+        chunk_summaries = list(await asyncio.gather(*[
+            reduce_batch(batch_idx, batch) for batch_idx, batch in enumerate(batches)
+        ]))
+    result_str = chunk_summaries[0]
+
+    # Sauvegarde du résultat, partagée entre utilisateurs pour un même contenu
+    # (écriture transactionnelle : un lecteur voit l'ancien résumé ou le nouveau, jamais un fichier partiel)
+    await asyncio.to_thread(store_summary, doc_hash, params, result_str)
 
     return result_str
 
@@ -174,11 +294,11 @@ async def crewai_summarize_old(pdf: str, pages: int = 6, history: Optional[str]
     Returns:
         str: Résumé généré par CrewAI
     """
-    firstpages = await extract_page_text_from_file(src=pdf)
     try:
-        content = "\n".join(firstpages[:int(pages)])
+        max_pages = int(pages)
     except ValueError:
-        content = "\n".join(firstpages[:6])
+        max_pages = 6
+    content = "\n".join([page async for page in iter_page_text_from_file(pdf, max_pages=max_pages)])
 
     # Définition des agents
     agents = {
@@ -234,57 +354,95 @@ async def crewai_summarize_old(pdf: str, pages: int = 6, history: Optional[str]
         process=Process.sequential
     )
 
-    result = await crew.kickoff_async()
+    result = await run_crew(crew)
     result_str = result.raw
 
-    # Sauvegarde du résultat
-    txt_path = f"{pdf}.txt"
-    async with aiofiles.open(txt_path, "w", encoding="utf-8") as file:
-        await file.write(result_str)
+    # Sauvegarde du résultat, partagée entre utilisateurs pour un même contenu
+    # (écriture transactionnelle : un lecteur voit l'ancien résumé ou le nouveau, jamais un fichier partiel).
+    # La méthode fait partie de la clé : ce résumé en une passe ne remplace pas celui de crewai_summarize.
+    doc_hash = await asyncio.to_thread(hash_file, pdf)
+    params = {**_summary_params(llm, max_pages), 'method': 'single_pass'}
+    await asyncio.to_thread(store_summary, doc_hash, params, result_str)
 
     return result_str
 
 
-async def generate_diagram_check_structure(diagramData):
+async def generate_diagram_check_structure(diagramData: Dict, name: str = "", description: str = "") -> Dict:
     """
-    Check the structure of the diagramData and return a json
+    Vérifie et répare la structure d'un diagramme.
+
+    La validation (cycles, chemin vers le nœud output, références inexistantes, champs
+    manquants) est faite localement ; un LLM n'est sollicité que pour détailler les liens
+    vers le nœud output, si DIAGRAM_LLM_ENRICHMENT est actif.
+
+    Args:
+        diagramData (Dict): Diagramme à vérifier
+        name (str): Nom utilisé si le diagramme n'en a pas
+        description (str): Description utilisée si le diagramme n'en a pas
+
+    Returns:
+        Dict: Diagramme normalisé
     """
-    # Définir les tâches
+    diagram, report = normalize_diagram(diagramData, name=name, description=description)
+    for correction in report:
+        print(f"Diagramme : {correction}")
+    if DIAGRAM_LLM_ENRICHMENT and links_to_enrich(diagram):
+        try:
+            diagram = await enrich_diagram_links(diagram)
+        except Exception as e:
+            print(f"Enrichissement du diagramme impossible : {str(e)}")
+    return diagram
+
+async def enrich_diagram_links(diagram: Dict) -> Dict:
+    """
+    Détaille avec un LLM la description et la sortie attendue des liens vers le nœud output.
+
+    Seuls ces deux champs sont repris de la réponse : la structure du diagramme reste
+    celle validée localement.
+
+    Args:
+        diagram (Dict): Diagramme normalisé
+
+    Returns:
+        Dict: Diagramme enrichi
+    """
+    links = links_to_enrich(diagram)
+    roles = {node['key']: node.get('role', '') for node in diagram['nodes']}
     diagram_expert = Agent(
             role='Expert en Conception de Diagrammes',
-            goal="""Vérifier la structure d'un diagramme à partir du json qui le représente""",
+            goal="""Détailler les tâches d'un diagramme à partir du json qui le représente""",
             backstory="""Vous êtes un expert dans la création de diagrammes qui représentent des workflows complexes. 
             Vous excellez dans l'identification des agents clés, leurs rôles et les relations entre eux.""",
             verbose=True,
             allow_delegation=False
         )
-    
 
-    create_diagram = Task(
-        description=f"""À partir de l'analyse du json suivant, améliorer la structure du diagramme :
-        1. en supprimant les liens formant des relations circulaires entre les nœuds du diagramme
-        2. en vérifiant qu'au moins un nœud est lié par une relation au nœud output 
-        4. en ajoutant du détail aux relations pointant vers le noeud output (tâche attendue, description, expected outpout) 
+    enrich_links = Task(
+        description=f"""Pour chacune des relations suivantes, qui transmettent un résultat au nœud output du diagramme,
+        rédigez la tâche attendue (description) et la sortie attendue (expected_output).
         
-        JSON : {json.dumps(diagramData, indent=2)}
+        Diagramme : {diagram.get('description', '')}
+        Relations : {json.dumps([{'id': link['id'], 'agent': roles.get(link['from'], link['from'])} for link in links], ensure_ascii=False, indent=2)}
         
         """,
         agent=diagram_expert,
-        expected_output="""Une chaîne JSON valide représentant la structure du diagramme avec :
-        1. Un tableau de nœuds contenant les définitions des agents
-        2. Un tableau de liens contenant les définitions des tâches/relations
-        Le JSON doit conserver exactement le format initial."""
+        expected_output="""Un objet JSON valide associant l'id de chaque relation à un objet
+        {"description": "...", "expected_output": "..."}."""
     )
 
-    # Créer et exécuter le crew
     crew = Crew(
         agents=[diagram_expert],
-        tasks=[create_diagram]
+        tasks=[enrich_links]
     )
 
-    kickoff = await crew.kickoff_async()
-    result = kickoff.raw
-    return result.split("```json")[-1].split("```")[0].strip()
+    kickoff = await run_crew(crew)
+    details = json.loads(kickoff.raw.split("```json")[-1].split("```")[0].strip())
+    for link in links:
+        detail = details.get(link['id'])
+        if isinstance(detail, dict):
+            link['description'] = str(detail.get('description') or link['description'])
+            link['expected_output'] = str(detail.get('expected_output') or link['expected_output'])
+    return diagram
 
 
 async def generate_diagram_from_description(description: str, name: str = "Nouveau Diagramme") -> Dict:
@@ -373,7 +531,7 @@ async def generate_diagram_from_description(description: str, name: str = "Nouve
         tasks=[analyze_text, create_diagram]
     )
 
-    kickoff = await crew.kickoff_async()
+    kickoff = await run_crew(crew)
     result = kickoff.raw
    
 
@@ -382,74 +540,79 @@ async def generate_diagram_from_description(description: str, name: str = "Nouve
         json_str = result.split("```json")[-1].split("```")[0].strip()
         diagram_data = json.loads(json_str)
         
-        # Ajouter le nœud output s'il n'existe pas déjà
-        has_output = False
-        for node in diagram_data["nodes"]:
-            if node["key"] == "output":
-                has_output = True
-                break
-        
-        if not has_output:
-            output_node = {
-                "key": "output",
-                "type": "output",
-                "role": "Output",
-                "goal": "Collecte et formate la sortie finale",
-                "backstory": "Je suis responsable de collecter et de formater la sortie finale du processus",
-                "file": ""
-            }
-            diagram_data["nodes"].append(output_node)
-
-            # Ajouter des liens vers le nœud output pour tous les nœuds qui n'ont pas de liens sortants
-            nodes_with_outgoing = set(link["from"] for link in diagram_data["links"])
-            for node in diagram_data["nodes"]:
-                if node["key"] != "output" and node["key"] not in nodes_with_outgoing:
-                    new_link = {
-                        "id": f"link_{node['key']}_output",
-                        "from": node["key"],
-                        "to": "output",
-                        "description": "Envoie les résultats à la sortie",
-                        "expected_output": "Sortie finale de cet agent",
-                        "type": "task"
-                    }
-                    diagram_data["links"].append(new_link)
-        
-        # S'assurer que le nom et la description sont présents
-        if "name" not in diagram_data:
-            diagram_data["name"] = name
-        if "description" not in diagram_data:
-            diagram_data["description"] = description
-        
-        # Vérifier la structure et parser le résultat
-        checked_json_str = await generate_diagram_check_structure(diagram_data)
-        return json.loads(checked_json_str)
+        # Vérifier et réparer la structure (nœud output, cycles, liens invalides)
+        return await generate_diagram_check_structure(diagram_data, name=name, description=description)
 
     except Exception as e:
         print(f"Erreur : {str(e)}")
         raise ValueError(f"Échec de la génération du diagramme : {str(e)}")
 
-async def execute_process_from_diagram(data: Dict, folder: str = "", llm: str = "openai") -> Dict:
+async def execute_process_from_diagram(data: Dict, folder: str = "", llm: str = "openai", max_concurrency: Optional[int] = None, use_cache: bool = True, incremental: bool = True) -> Dict:
     """
     Exécute un processus basé sur un diagramme de tâches et d'agents de manière asynchrone.
     
+    Les nœuds indépendants sont exécutés en parallèle dès que leurs prédécesseurs ont terminé.
+    En mode incrémental, seuls les nœuds modifiés depuis le dernier run du diagramme et leurs
+    descendants sont réexécutés ; les autres reprennent le résultat enregistré.
+    
     Args:
         data (Dict): Données JSON décrivant les nœuds et les liens du diagramme
         folder (str): Répertoire contenant les fichiers associés aux agents
         llm (str): Modèle de langage à utiliser
+        max_concurrency (Optional[int]): Nombre maximal de nœuds exécutés simultanément
+        use_cache (bool): Réutiliser les résultats des nœuds dont l'entrée effective n'a pas changé
+        incremental (bool): Ne réexécuter que le sous-graphe modifié depuis le dernier run
         
     Returns:
         Dict: Résultats de l'exécution du processus
     """
     print(llm)
-    reset_chroma()
 
     try:
         nodes = {node['key']: node for node in data['nodes']}
         links = data['links']
+        diagram_name = data.get('name') or "default"
         agents_dict = {}
-        all_results = []
         backstories = []  # Initialize backstories list
         agent_results = {}  # Dictionnaire pour stocker les résultats par agent
+        file_contexts = {}  # Contextes issus des fichiers, par nœud
+        context_reports = {}  # Utilisation du budget de contexte, par nœud
+        node_files = {}  # Empreintes des fichiers utilisés par les outils, par nœud
+        cache_hits = []  # Nœuds dont le résultat provient du cache
+        input_hashes = {}  # Empreintes des entrées effectives, par nœud
+
+        # Construire le graphe des tâches
+        task_graph = nx.DiGraph()
+        for link in links:
+            task_graph.add_edge(
+                link['from'],
+                link['to'],
+                description=link.get('description', 'Effectuer une tâche'),
+                expected_output=link.get('expected_output', '')
+            )
+
+        # Effectuer un tri topologique
+        try:
+            task_order = list(nx.topological_sort(task_graph))
+        except nx.NetworkXUnfeasible:
+            return {
+                'status': 'error',
+                'message': 'Le graphe contient des cycles, impossible de déterminer un ordre des tâches.'
+            }
+
+        roots = [node for node in task_graph.nodes if task_graph.in_degree(node) == 0]
+        node_results = {}  # Résultats formatés par nœud, réassemblés dans l'ordre topologique
+
+        # Comparer le diagramme au dernier run pour déterminer le sous-graphe à réexécuter
+        signatures = {}
+        for node in data['nodes']:
+            src = os.path.join(folder, node['file']) if node.get('file') else ""
+            file_hash = await asyncio.to_thread(hash_file, src) if src and os.path.exists(src) else None
+            signatures[node['key']] = node_signature(node, task_graph, file_hash, llm)
+        previous_run = await asyncio.to_thread(load_run, folder, diagram_name) if incremental else {'nodes': {}}
+        forced = [node['key'] for node in data['nodes'] if node.get('summarize') == "Force"]
+        dirty = dirty_nodes(task_graph, signatures, previous_run, always_dirty=forced)
+        previous_nodes = previous_run.get('nodes', {})
 
         # Initialiser les agents
         for node in data['nodes']:
@@ -462,25 +625,32 @@ async def execute_process_from_diagram(data: Dict, folder: str = "", llm: str =
                 llm=choose_llm(llm),
                 verbose=False
             )
+            file_contexts[node['key']] = []
+            node_files[node['key']] = []
+
+            # Résultat repris du run précédent : inutile de préparer le fichier du nœud
+            if node['key'] not in dirty:
+                continue
             
             if file := node.get('file', ''):
                 src = os.path.join(folder, file)
                 if os.path.exists(src):
                     if rag=="Yes": 
                         print(f"RAG on {src}")
-                        agents_dict[node['key']].tools = [choose_tool(src=src)]
+                        agents_dict[node['key']].tools = [await asyncio.to_thread(choose_tool, src=src)]
+                        node_files[node['key']].append(await asyncio.to_thread(hash_file, src))
                         # agents_dict[node['key']].verbose = True
                         summarize = "No"
 
                     if summarize=="Force":
                         print("With backstory with force")
                         backstory = await crewai_summarize(pdf=src, llm=llm)
-                        agents_dict[node['key']].backstory += f"\n\nContexte du fichier {file} :\n{backstory}"
+                        file_contexts[node['key']].append((f"Contexte du fichier {file}", backstory))
                         
                     elif summarize=="Yes":
                         print("With backstory without forcing sumup")
                         backstory = await crewai_summarize_if_not_exists(pdf=src, llm=llm)
-                        agents_dict[node['key']].backstory += f"\n\nContexte du fichier {file} :\n{backstory}"
+                        file_contexts[node['key']].append((f"Contexte du fichier {file}", backstory))
 
                     else:
                         print(f"No summary is used on {src}")
@@ -499,35 +669,51 @@ async def execute_process_from_diagram(data: Dict, folder: str = "", llm: str =
             except Exception as e:
                 print(f"Error initializing agent status: {str(e)}")
 
-        # Construire le graphe des tâches
-        task_graph = nx.DiGraph()
-        for link in links:
-            task_graph.add_edge(
-                link['from'],
-                link['to'],
-                description=link.get('description', 'Effectuer une tâche'),
-                expected_output=link.get('expected_output', '')
-            )
-
-        # Effectuer un tri topologique
-        try:
-            task_order = list(nx.topological_sort(task_graph))
-        except nx.NetworkXUnfeasible:
-            return {
-                'status': 'error',
-                'message': 'Le graphe contient des cycles, impossible de déterminer un ordre des tâches.'
-            }
-
-        roots = [node for node in task_graph.nodes if task_graph.in_degree(node) == 0]
-
-        # Exécuter les tâches
-        for node_key in task_order:
-            current_node = nodes[node_key]
+        # Les contextes sont comptés avec le tokenizer du modèle, comme les chunks des documents
+        context_model = llm_configs.get(llm, {}).get("model")
+
+        def build_context(node_key: str) -> None:
+            """Assemble la backstory d'un nœud : chaque contexte amont une seule fois, dans le budget."""
+            node = nodes[node_key]
+            sections = list(file_contexts[node_key])
+            if node_key in task_graph:
+                for predecessor in task_graph.predecessors(node_key):
+                    if predecessor in agent_results:
+                        sections.append((f"Résultat de {agents_dict[predecessor].role}", agent_results[predecessor]))
+                query = " ".join(
+                    [node.get('goal', '')] +
+                    [f"{link.get('description', '')} {link.get('expected_output', '')}" for _, _, link in task_graph.out_edges(node_key, data=True)]
+                )
+            else:
+                query = node.get('goal', '')
+
+            budget = int(node.get('context_budget') or CONTEXT_TOKEN_BUDGET)
+            backstory, report = assemble_context(node.get('backstory', ''), sections, budget=budget, query=query, model=context_model)
+            agents_dict[node_key].backstory = backstory
+            context_reports[node_key] = report
+
+        def reuse_previous(node_key: str) -> None:
+            """Reprend le résultat, la backstory et le rapport de contexte du run précédent."""
+            entry = previous_nodes[node_key]
+            agents_dict[node_key].backstory = entry.get('backstory', agents_dict[node_key].backstory)
+            context_reports[node_key] = entry.get('context', {})
+            if entry.get('input_hash'):
+                input_hashes[node_key] = entry['input_hash']
+            if entry.get('output') is not None:
+                agent_results[node_key] = entry['output']
+                node_results[node_key] = entry.get('formatted', '')
+
+        async def run_node(node_key: str) -> None:
+            """Exécute la tâche d'un nœud dont tous les prédécesseurs sont terminés."""
+            if node_key not in dirty:
+                reuse_previous(node_key)
+                return
+
+            build_context(node_key)
             outgoing_links = task_graph.out_edges(node_key, data=True)
 
             for from_key, to_key, link_data in outgoing_links:
                 from_agent = agents_dict[from_key]
-                to_agent = agents_dict[to_key]
 
                 task = Task(
                     description=link_data['description'],
@@ -541,7 +727,6 @@ async def execute_process_from_diagram(data: Dict, folder: str = "", llm: str =
                     if from_key in agent_results:
                         # Réutiliser le résultat existant
                         result = agent_results[from_key]
-                        to_agent.backstory += f"\n\nRésultat de {from_agent.role} : {result}"
                         await manager.broadcast({
                             "type": "agent_highlight",
                             "agent_id": from_key,
@@ -557,6 +742,36 @@ async def execute_process_from_diagram(data: Dict, folder: str = "", llm: str =
                             "status": "inactive",
                             "task_description": ""
                         })
+                        continue
+
+                    cache_key = node_input_hash(from_agent, task.description, task.expected_output, node_files[from_key])
+                    input_hashes[from_key] = cache_key
+                    cached = await asyncio.to_thread(node_cache.get, cache_key) if use_cache else None
+                    if cached is not None:
+                        # Entrée identique à une exécution précédente : réutiliser le résultat en cache
+                        agent_results[from_key] = cached
+                        cache_hits.append(from_key)
+                        await manager.broadcast({
+                            "type": "agent_highlight",
+                            "agent_id": from_key,
+                            "status": "active",
+                            "cache_hit": True,
+                            "task_description": f"Résultat en cache pour {from_agent.role}"
+                        })
+                        print(f"{MAGENTA}CACHE HIT{END} : \n{RED}{from_agent.role}{END}")
+                        await manager.broadcast({
+                            "type": "agent_highlight",
+                            "agent_id": from_key,
+                            "status": "inactive",
+                            "cache_hit": True,
+                            "task_description": ""
+                        })
+                        node_results[from_key] = (
+                            f"\n\n***\n\n"
+                            f"\n\n## {from_agent.role}\n\n"
+                            f"\n\n### {task.description}\n\n"
+                            f"\n\n{cached}\n\n"
+                        )
                     else:
                         # Exécuter la tâche normalement
                         await manager.broadcast({
@@ -566,12 +781,16 @@ async def execute_process_from_diagram(data: Dict, folder: str = "", llm: str =
                             "task_description": task.description
                         })
                         crew = Crew(agents=[from_agent], tasks=[task])
-                        kickoff = await crew.kickoff_async()
+                        # Échéance des appels LLM de la tâche : lien, puis nœud, puis valeur par défaut
+                        deadline = float(link_data.get('deadline') or nodes[from_key].get('deadline') or LLM_TASK_DEADLINE)
+                        with llm_deadline(deadline):
+                            kickoff = await run_crew(crew)
                         result = task.output.raw
                         print(f"{MAGENTA}TASK RESULT{END} : \n{GREEN}{result}{END}")
                         # Stocker le résultat pour cet agent
                         agent_results[from_key] = result
-                        to_agent.backstory += f"\n\nRésultat de {from_agent.role} : {result}"
+                        if use_cache:
+                            await asyncio.to_thread(node_cache.set, cache_key, result)
                         await manager.broadcast({
                             "type": "agent_highlight",
                             "agent_id": from_key,
@@ -586,8 +805,7 @@ async def execute_process_from_diagram(data: Dict, folder: str = "", llm: str =
                             f"\n\n{result}\n\n"
                         )
                         
-                        to_agent.backstory += f"\n\nRésultat de {from_agent.role} : {result}"
-                        all_results.append(formatted_result)
+                        node_results[from_key] = formatted_result
                         
                         print(f"{MAGENTA}AGENT{END} : \n{RED}{from_agent.role}{END}")
                         print(f"{MAGENTA}TASK DESCRIPTION{END} : \n{RED}{task.description}{END}")
@@ -596,17 +814,47 @@ async def execute_process_from_diagram(data: Dict, folder: str = "", llm: str =
                 except Exception as e:
                     print(f"Erreur lors de l'exécution de la tâche : {str(e)}")
 
+        # Exécuter les tâches : chaque nœud démarre dès que ses prédécesseurs sont terminés
+        await run_dag(task_graph, run_node, max_concurrency=max_concurrency)
+        all_results = [node_results[key] for key in task_order if key in node_results]
+
         for agent_key, agent in agents_dict.items():
+            if agent_key not in context_reports:
+                if agent_key in dirty:
+                    build_context(agent_key)
+                else:
+                    reuse_previous(agent_key)
             backstories.append({
                 'role': agent.role,
-                'backstory': agent.backstory
+                'backstory': agent.backstory,
+                **context_reports[agent_key]
+            })
+
+        # Enregistrer ce run comme référence pour la prochaine exécution incrémentale
+        if incremental:
+            await asyncio.to_thread(save_run, folder, diagram_name, {
+                'nodes': {
+                    key: {
+                        'signature': signatures[key],
+                        'input_hash': input_hashes.get(key),
+                        'output': agent_results.get(key),
+                        'formatted': node_results.get(key),
+                        'backstory': agents_dict[key].backstory,
+                        'context': context_reports.get(key, {})
+                    }
+                    for key in agents_dict
+                }
             })
 
+        executed = [key for key in task_order if task_graph.out_degree(key) > 0]
         return {
             'status': 'success',
             'message': "\n".join(all_results),
             'backstories': backstories,
-            'branches_count': len(roots)
+            'branches_count': len(roots),
+            'cache_hits': cache_hits,
+            'recomputed': [key for key in executed if key in dirty],
+            'reused': [key for key in executed if key not in dirty]
         }
 
     except Exception as e:
@@ -686,7 +934,7 @@ async def ask_process_from_diagram(question: str, diagram_result: str, llm: str
 
         try:
             # Exécution du processus de manière asynchrone
-            kickoff = await crew.kickoff_async()
+            kickoff = await run_crew(crew)
             
             result = (
                         f"\n\n***\n\n"
@@ -708,6 +956,10 @@ async def ask_process_from_diagram(question: str, diagram_result: str, llm: str
 async def enhance_diagram_from_description(diagram_data: Dict, chat_input: str, llm: str = "openai") -> Dict:
     """
     Modifie un diagramme existant en fonction d'une description textuelle.
+
+    Le LLM reçoit une description compacte du diagramme et produit un patch (liste
+    d'opérations typées) plutôt que le diagramme complet ; le patch est validé puis
+    appliqué au diagramme reçu.
     
     Args:
         diagram_data (Dict): Données JSON du diagramme à modifier
@@ -717,122 +969,67 @@ async def enhance_diagram_from_description(diagram_data: Dict, chat_input: str,
     Returns:
         Dict: Diagramme modifié
     """
-    # Création des agents
-    diagram_analyst = Agent(
-        name="Analyste de Diagramme",
-        role="Expert en analyse de diagrammes",
-        goal="Comprendre la structure actuelle du diagramme sans la modifier",
-        backstory="""Je suis un expert en analyse de diagrammes qui comprend parfaitement la structure des données JSON.
-Je sais que le diagramme contient deux parties essentielles :
-1. nodes: liste des nœuds avec les propriétés key, type, role, goal, backstory, tools, file, summarize, position
-2. links: liste des liens avec les propriétés id, from, to, description, expected_output, relationship""",
-        llm=choose_llm(llm),
-        verbose=False
-    )
-    
-    modification_planner = Agent(
-        name="Planificateur de Modifications",
-        role="Expert en planification de modifications",
-        goal="Planifier les modifications tout en préservant la structure exacte du JSON",
-        backstory="""Je suis un expert qui traduit des descriptions textuelles en modifications concrètes de diagramme.
-Je comprends parfaitement la structure du JSON et je sais qu'il faut absolument préserver :
-- Les noms exacts des propriétés (key, type, role, etc.)
-- Le format des valeurs (strings, arrays, objects)
-- La structure hiérarchique (nodes et links comme listes d'objets)""",
-        llm=choose_llm(llm),
-        verbose=True
-    )
-    
+    diagram_data = {key: value for key, value in diagram_data.items() if key != 'chatInput'}
+
     diagram_modifier = Agent(
         name="Modificateur de Diagramme",
         role="Expert en modification de diagrammes",
-        goal="Appliquer les modifications en conservant strictement le format JSON",
-        backstory="""Je suis un expert qui modifie les diagrammes tout en maintenant leur cohérence.
-Ma priorité absolue est de préserver la structure exacte du JSON :
-1. Pour les nodes : key, type, role, goal, backstory, tools, file, summarize, position
-2. Pour les links : id, from, to, description, expected_output, relationship""",
+        goal="Traduire une demande de modification en une liste minimale d'opérations sur le diagramme",
+        backstory="""Je suis un expert qui traduit des descriptions textuelles en modifications concrètes de diagramme.
+Je ne réécris jamais le diagramme : je décris uniquement les changements, sous forme d'opérations.""",
         llm=choose_llm(llm),
         verbose=False
     )
 
-    # Création des tâches
-    tasks = [
-        Task(
-            name="Analyse du Diagramme",
-            agent=diagram_analyst,
-            description=f"""Analyser le diagramme existant et identifier ses composants principaux.
-Input JSON Structure:
-{json.dumps(diagram_data, indent=2)}
+    apply_modifications = Task(
+        name="Planification des Modifications",
+        agent=diagram_modifier,
+        description=f"""Diagramme actuel :
+{diagram_outline(diagram_data)}
 
-Instructions :
-1. Analyser la structure des nœuds (nodes) et leurs relations (links)
-2. Identifier les rôles et responsabilités de chaque nœud
-3. Comprendre les flux de travail existants
-4. NE PAS modifier la structure ou les noms des propriétés
-
-Format de sortie attendu : Description textuelle de l'analyse""",
-            expected_output="Une description détaillée de la structure actuelle du diagramme."
-        ),
-        Task(
-            name="Planification des Modifications",
-            agent=modification_planner,
-            description=f"""En te basant sur l'analyse du diagramme et la description suivante, planifie les modifications nécessaires.
-
-Description des modifications souhaitées :
+Modifications souhaitées :
 {chat_input}
 
-Instructions :
-1. Planifier les modifications nécessaires
-2. S'assurer que chaque modification respecte la structure JSON
-3. Vérifier que les noms des propriétés restent exacts
-4. Maintenir la cohérence des relations entre les nœuds
-5. S'assurer que le noeud output est bien conservé et correctement relié
-
-Format de sortie attendu : Liste des modifications à apporter, sans inclure le JSON modifié""",
-            expected_output="Une liste détaillée des modifications à apporter au diagramme."
-        ),
-        Task(
-            name="Application des Modifications",
-            agent=diagram_modifier,
-            description=f"""Modifier le diagramme selon le plan établi en respectant strictement le format JSON.
+Exprimer les modifications sous forme d'une liste d'opérations JSON, parmi :
+- {{"op": "add_node", "node": {{"key": "...", "role": "...", "goal": "...", "backstory": "..."}}}}
+- {{"op": "remove_node", "key": "..."}}
+- {{"op": "update_node", "key": "...", "fields": {{"role" | "goal" | "backstory" | "file" | "summarize" | "rag": "..."}}}}
+- {{"op": "add_link", "link": {{"from": "...", "to": "...", "description": "...", "expected_output": "..."}}}}
+- {{"op": "remove_link", "id": "..."}}
+- {{"op": "update_link", "id": "...", "fields": {{"description" | "expected_output": "..."}}}}
 
 Instructions :
-1. Appliquer les modifications planifiées en conservant le JSON EXISTANT
-2. Préserver EXACTEMENT les noms des propriétés :
-   - Pour les nodes : key, type, role, goal, backstory, tools, file, summarize, position
-   - Pour les links : id, from, to, description, expected_output, relationship
-3. Maintenir le format des valeurs (strings, arrays, objects)
-4. Conserver le noeud output et les relations qui pointent déjà vers lui
-5. Retourner le JSON modifié dans un bloc de code ```json
-
-JSON EXISTANT :
-{json.dumps(diagram_data, indent=2)}
-
-Format de sortie attendu : Le diagramme modifié au format JSON exact, encadré par ```json et ```""",
-            expected_output="Le diagramme modifié au format JSON."
-        )
-    ]
+1. N'inclure que les opérations nécessaires, en utilisant les clés et identifiants existants
+2. Ne jamais supprimer le nœud output ; les nœuds sans lien sortant lui sont reliés automatiquement
+3. Ne pas créer de relation circulaire
+
+Format de sortie attendu : la liste des opérations, encadrée par ```json et ```""",
+        expected_output="La liste des opérations au format JSON."
+    )
 
     # Création et exécution du crew
     crew = Crew(
-        agents=[diagram_analyst, modification_planner, diagram_modifier],
-        tasks=tasks,
+        agents=[diagram_modifier],
+        tasks=[apply_modifications],
         process=Process.sequential
     )
     
     try:
         # Exécution du crew
-        kickoff = crew.kickoff()
-        result = kickoff.raw
-        # Extraction et validation des modifications
+        kickoff = await run_crew(crew)
+        # Validation et application du patch
         try:
-            modified_diagram = json.loads(result.split("```json")[-1].split("```")[0].strip())
-            return modified_diagram
-        except json.JSONDecodeError:
-            # Si le résultat n'est pas un JSON valide, retourner le diagramme original
-            print(f"{RED}Erreur lors de la modification du diagramme. Retour du diagramme original.{END}")
+            patch = parse_patch(kickoff.raw)
+        except PatchError as e:
+            # Si le résultat n'est pas un patch valide, retourner le diagramme original
+            print(f"{RED}Erreur lors de la modification du diagramme ({str(e)}). Retour du diagramme original.{END}")
             return diagram_data
+        modified_diagram, report = apply_patch(diagram_data, patch)
+        print(f"Patch de {len(patch)} opération(s) appliqué au diagramme")
+        for correction in report:
+            print(f"Diagramme : {correction}")
+        return modified_diagram
             
     except Exception as e:
         print(f"{RED}Erreur lors de l'exécution du crew: {str(e)}{END}")
-        return diagram_data
\ No newline at end of file
+        return diagram_data
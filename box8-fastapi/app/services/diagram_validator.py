@@ -0,0 +1,204 @@
+import re
+from typing import Dict, List, Tuple
+import networkx as nx
+
+# Clé du nœud de sortie d'un diagramme
+OUTPUT_KEY = "output"
+
+# Valeurs par défaut des champs d'un nœud agent
+NODE_DEFAULTS = {
+    "type": "agent",
+    "role": "",
+    "goal": "",
+    "backstory": "",
+    "file": ""
+}
+
+# Nœud de sortie ajouté aux diagrammes qui n'en ont pas
+OUTPUT_NODE = {
+    "key": OUTPUT_KEY,
+    "type": "output",
+    "role": "Output",
+    "goal": "Collecte et formate la sortie finale",
+    "backstory": "Je suis responsable de collecter et de formater la sortie finale du processus",
+    "file": ""
+}
+
+# Textes des liens ajoutés vers le nœud de sortie
+OUTPUT_LINK_DESCRIPTION = "Envoie les résultats à la sortie"
+OUTPUT_LINK_EXPECTED = "Sortie finale de cet agent"
+
+def _text(value) -> str:
+    """Convertit une valeur de champ en chaîne (vide si absente)"""
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else str(value)
+
+def _slug(value: str) -> str:
+    """Identifiant dérivé d'un libellé (minuscules, caractères alphanumériques et _)"""
+    return re.sub(r"[^a-z0-9]+", "_", value.lower()).strip("_")
+
+def _unique(key: str, used: set) -> str:
+    """Rend une clé unique en lui ajoutant un suffixe numérique si besoin"""
+    candidate = key
+    index = 2
+    while candidate in used:
+        candidate = f"{key}_{index}"
+        index += 1
+    used.add(candidate)
+    return candidate
+
+def _repair_nodes(raw_nodes, report: List[str]) -> List[Dict]:
+    """Nœuds valides : dictionnaires avec une clé unique et les champs attendus"""
+    nodes = []
+    used = set()
+    for index, raw in enumerate(raw_nodes if isinstance(raw_nodes, list) else []):
+        if not isinstance(raw, dict):
+            report.append(f"Nœud {index} ignoré : format invalide")
+            continue
+        node = dict(raw)
+        key = _text(node.get("key") or node.get("id")).strip() or _slug(_text(node.get("role"))) or f"agent_{index + 1}"
+        unique_key = _unique(key, used)
+        if unique_key != _text(raw.get("key")):
+            report.append(f"Nœud {index} : clé « {unique_key} » attribuée")
+        node["key"] = unique_key
+        for field, default in NODE_DEFAULTS.items():
+            node[field] = _text(node.get(field)) or default
+        if node["key"] == OUTPUT_KEY:
+            node["type"] = "output"
+        nodes.append(node)
+    return nodes
+
+def _repair_links(raw_links, keys: set, output_key: str, report: List[str]) -> List[Dict]:
+    """Liens valides : extrémités existantes, sans boucle ni doublon, jamais depuis la sortie"""
+    links = []
+    seen = set()
+    used_ids = set()
+    for index, raw in enumerate(raw_links if isinstance(raw_links, list) else []):
+        if not isinstance(raw, dict):
+            report.append(f"Lien {index} ignoré : format invalide")
+            continue
+        link = dict(raw)
+        source = _text(link.get("from", link.get("source"))).strip()
+        target = _text(link.get("to", link.get("target"))).strip()
+        if source not in keys or target not in keys:
+            report.append(f"Lien {source} → {target} supprimé : nœud inexistant")
+            continue
+        if source == target:
+            report.append(f"Lien {source} → {target} supprimé : boucle sur un nœud")
+            continue
+        if source == output_key:
+            report.append(f"Lien {source} → {target} supprimé : le nœud de sortie n'a pas de successeur")
+            continue
+        if (source, target) in seen:
+            report.append(f"Lien {source} → {target} supprimé : doublon")
+            continue
+        seen.add((source, target))
+        link.pop("source", None)
+        link.pop("target", None)
+        link["from"] = source
+        link["to"] = target
+        link["id"] = _unique(_text(link.get("id")).strip() or f"link_{source}_{target}", used_ids)
+        link["description"] = _text(link.get("description")) or "Effectuer une tâche"
+        link["expected_output"] = _text(link.get("expected_output"))
+        link["type"] = _text(link.get("type")) or "task"
+        links.append(link)
+    return links
+
+def _break_cycles(links: List[Dict], report: List[str]) -> List[Dict]:
+    """
+    Supprime des liens jusqu'à obtenir un graphe acyclique.
+
+    Dans chaque cycle trouvé, le lien retiré est le dernier déclaré : les premiers liens
+    décrivent en général le flux principal du diagramme.
+    """
+    order = {(link["from"], link["to"]): index for index, link in enumerate(links)}
+    graph = nx.DiGraph()
+    graph.add_edges_from(order)
+    removed = set()
+    while True:
+        try:
+            cycle = nx.find_cycle(graph)
+        except nx.NetworkXNoCycle:
+            break
+        edge = max(((source, target) for source, target, *_ in cycle), key=order.get)
+        graph.remove_edge(*edge)
+        removed.add(edge)
+        report.append(f"Lien {edge[0]} → {edge[1]} supprimé : relation circulaire")
+    return [link for link in links if (link["from"], link["to"]) not in removed]
+
+def normalize_diagram(data: Dict, name: str = "", description: str = "") -> Tuple[Dict, List[str]]:
+    """
+    Valide et répare localement la structure d'un diagramme, sans appel à un LLM.
+
+    Les nœuds et liens mal formés sont corrigés ou écartés, les liens vers des nœuds
+    inexistants supprimés, les cycles rompus, et chaque nœud sans successeur est relié
+    au nœud de sortie (créé si besoin) : tout agent a ainsi un chemin vers la sortie.
+    L'ordre des nœuds et des liens conservés est respecté, et le résultat est stable :
+    normaliser un diagramme déjà normalisé ne le modifie pas.
+
+    Args:
+        data (Dict): Diagramme ({'name', 'description', 'nodes', 'links'})
+        name (str): Nom utilisé si le diagramme n'en a pas
+        description (str): Description utilisée si le diagramme n'en a pas
+
+    Returns:
+        Tuple[Dict, List[str]]: Diagramme normalisé et liste des corrections effectuées
+    """
+    report = []
+    if not isinstance(data, dict):
+        report.append("Diagramme invalide, remplacé par un diagramme vide")
+        data = {}
+    diagram = dict(data)
+    diagram["name"] = _text(data.get("name")) or name
+    diagram["description"] = _text(data.get("description")) or description
+
+    nodes = _repair_nodes(data.get("nodes"), report)
+    output = next((node for node in nodes if node["key"] == OUTPUT_KEY), None) \
+        or next((node for node in nodes if node["type"] == "output"), None)
+    if output is None:
+        output = dict(OUTPUT_NODE)
+        nodes.append(output)
+        report.append("Nœud de sortie ajouté")
+    output_key = output["key"]
+
+    links = _repair_links(data.get("links"), {node["key"] for node in nodes}, output_key, report)
+    links = _break_cycles(links, report)
+
+    # Chaque nœud sans successeur est relié à la sortie
+    sources = {link["from"] for link in links}
+    used_ids = {link["id"] for link in links}
+    for node in nodes:
+        if node["key"] != output_key and node["key"] not in sources:
+            links.append({
+                "id": _unique(f"link_{node['key']}_{output_key}", used_ids),
+                "from": node["key"],
+                "to": output_key,
+                "description": OUTPUT_LINK_DESCRIPTION,
+                "expected_output": OUTPUT_LINK_EXPECTED,
+                "type": "task"
+            })
+            report.append(f"Lien {node['key']} → {output_key} ajouté")
+
+    diagram["nodes"] = nodes
+    diagram["links"] = links
+    return diagram, report
+
+def links_to_enrich(diagram: Dict) -> List[Dict]:
+    """
+    Liens vers le nœud de sortie dont la tâche n'est décrite que par un texte générique.
+
+    Args:
+        diagram (Dict): Diagramme normalisé
+
+    Returns:
+        List[Dict]: Liens à détailler
+    """
+    output_keys = {node["key"] for node in diagram.get("nodes", []) if node.get("type") == "output"}
+    return [
+        link for link in diagram.get("links", [])
+        if link["to"] in output_keys and (
+            link["description"] in ("", "Effectuer une tâche", OUTPUT_LINK_DESCRIPTION)
+            or link["expected_output"] in ("", OUTPUT_LINK_EXPECTED)
+        )
+    ]
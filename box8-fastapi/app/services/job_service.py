@@ -0,0 +1,308 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+from uuid import uuid4
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+from ..websocket.manager import manager
+
+# Nombre de workers exécutant les runs en parallèle (par processus)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Nombre maximal de runs en attente, tous utilisateurs et processus confondus
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "20"))
+# Nombre maximal de runs en attente ou en cours par utilisateur
+JOB_MAX_PENDING_PER_USER = int(os.getenv("JOB_MAX_PENDING_PER_USER", "3"))
+# Nombre maximal de runs exécutés simultanément par utilisateur
+JOB_MAX_RUNNING_PER_USER = int(os.getenv("JOB_MAX_RUNNING_PER_USER", "1"))
+# Durée de conservation des runs terminés (secondes)
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))
+# Base SQLite des runs, partagée par tous les processus du serveur
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "cache/jobs.db")
+# Intervalle de vérification des runs bloqués par un run d'un autre processus (secondes)
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+
+class JobRejected(Exception):
+    """Levée quand un run est refusé par le contrôle d'admission"""
+
+def _pid_alive(pid: int) -> bool:
+    """Indique si un processus existe encore"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class JobManager:
+    """
+    File d'attente des runs de diagrammes, servie par un pool borné de workers.
+
+    L'état des runs est conservé dans une base SQLite partagée : avec plusieurs processus
+    (uvicorn --workers), un run lancé sur l'un est consultable depuis tous, et les limites
+    d'admission s'appliquent à l'ensemble du serveur. Un run s'exécute dans le processus
+    qui l'a reçu. Chaque run reçoit un identifiant immédiatement ; son statut est
+    consultable via get() et diffusé sur le canal WebSocket (messages de type run_status).
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, queue_size: int = JOB_QUEUE_SIZE,
+                 max_pending_per_user: int = JOB_MAX_PENDING_PER_USER,
+                 max_running_per_user: int = JOB_MAX_RUNNING_PER_USER,
+                 result_ttl: int = JOB_RESULT_TTL, path: str = JOB_STORE_PATH):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_pending_per_user = max_pending_per_user
+        self.max_running_per_user = max_running_per_user
+        self.result_ttl = result_ttl
+        self.path = path
+        self._factories: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._pending: Deque[str] = deque()
+        self._condition: Optional[asyncio.Condition] = None
+        self._tasks: List[asyncio.Task] = []
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self):
+        """
+        Connexion à la base des runs, dans une transaction exclusive en écriture : les
+        vérifications d'admission et la prise en charge d'un run sont atomiques entre processus.
+        """
+        if not self._initialized:
+            self._init_db()
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            yield db
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        finally:
+            db.close()
+
+    def _init_db(self) -> None:
+        """Crée le fichier et la table des runs s'ils n'existent pas"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                run_id TEXT PRIMARY KEY,
+                user TEXT NOT NULL,
+                status TEXT NOT NULL,
+                owner INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                result TEXT,
+                error TEXT
+            )
+            ''')
+            db.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)')
+            db.execute('CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs (user, status)')
+            db.commit()
+        finally:
+            db.close()
+        self._initialized = True
+
+    async def start(self) -> None:
+        """Démarre les workers (sans effet s'ils tournent déjà)"""
+        if self._tasks:
+            return
+        self._recover()
+        self._condition = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(max(1, self.workers))]
+
+    async def stop(self) -> None:
+        """Arrête les workers et marque en erreur les runs de ce processus non terminés"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'error', error = ?, finished_at = ? "
+                "WHERE owner = ? AND status IN ('queued', 'running')",
+                ("Run interrompu par l'arrêt du serveur", time.time(), os.getpid())
+            )
+        self._pending.clear()
+        self._factories.clear()
+
+    def _recover(self) -> None:
+        """Marque en erreur les runs non terminés dont le processus a disparu"""
+        with self._connect() as db:
+            owners = [row['owner'] for row in db.execute(
+                "SELECT DISTINCT owner FROM jobs WHERE status IN ('queued', 'running')"
+            )]
+            for owner in owners:
+                if owner != os.getpid() and not _pid_alive(owner):
+                    db.execute(
+                        "UPDATE jobs SET status = 'error', error = ?, finished_at = ? "
+                        "WHERE owner = ? AND status IN ('queued', 'running')",
+                        ("Run interrompu par l'arrêt du serveur", time.time(), owner)
+                    )
+
+    async def submit(self, user: str, factory: Callable[[], Awaitable[Any]]) -> Dict:
+        """
+        Place un run dans la file d'attente.
+
+        Args:
+            user (str): Identifiant (email) de l'utilisateur
+            factory (Callable): Fonction retournant la coroutine à exécuter
+
+        Returns:
+            Dict: Description publique du run créé
+
+        Raises:
+            JobRejected: Si la file est pleine ou si l'utilisateur a trop de runs en cours
+        """
+        await self.start()
+        self._purge()
+
+        run_id = str(uuid4())
+        with self._connect() as db:
+            queued = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.queue_size:
+                raise JobRejected("File d'attente pleine, réessayez plus tard")
+            user_jobs = db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE user = ? AND status IN ('queued', 'running')", (user,)
+            ).fetchone()[0]
+            if user_jobs >= self.max_pending_per_user:
+                raise JobRejected(f"Nombre maximal de runs simultanés atteint ({self.max_pending_per_user})")
+            db.execute(
+                "INSERT INTO jobs (run_id, user, status, owner, created_at) VALUES (?, ?, 'queued', ?, ?)",
+                (run_id, user, os.getpid(), time.time())
+            )
+        self._factories[run_id] = factory
+        async with self._condition:
+            self._pending.append(run_id)
+            self._condition.notify_all()
+        await self._publish(run_id)
+        return self.describe(self.get(run_id))
+
+    def get(self, run_id: str) -> Optional[Dict]:
+        """Retourne le run correspondant à run_id, ou None"""
+        self._purge()
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is None:
+                return None
+            job = dict(row)
+            if job['status'] == 'queued':
+                job['position'] = db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at <= ?", (job['created_at'],)
+                ).fetchone()[0]
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def describe(self, job: Dict) -> Dict:
+        """
+        Description publique d'un run (statut, position dans la file, résultat).
+
+        Args:
+            job (Dict): Run retourné par get()
+
+        Returns:
+            Dict: Description du run
+        """
+        return {key: value for key, value in job.items() if key not in ('user', 'owner')}
+
+    def stats(self) -> Dict:
+        """Retourne l'état de la file d'attente (tous processus confondus)"""
+        with self._connect() as db:
+            counts = dict(db.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') GROUP BY status"
+            ).fetchall())
+        return {
+            'queued': counts.get('queued', 0),
+            'running': counts.get('running', 0),
+            'workers': len(self._tasks),
+            'queue_size': self.queue_size
+        }
+
+    def _claim_next(self) -> Optional[str]:
+        """
+        Premier run en attente de ce processus dont l'utilisateur n'a pas atteint sa limite
+        d'exécutions (tous processus confondus) ; il est marqué en cours.
+        """
+        with self._connect() as db:
+            for run_id in self._pending:
+                user = db.execute("SELECT user FROM jobs WHERE run_id = ?", (run_id,)).fetchone()['user']
+                running = db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE user = ? AND status = 'running'", (user,)
+                ).fetchone()[0]
+                if running < self.max_running_per_user:
+                    db.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ? WHERE run_id = ?", (time.time(), run_id)
+                    )
+                    self._pending.remove(run_id)
+                    return run_id
+        return None
+
+    async def _worker(self) -> None:
+        """Boucle d'un worker : exécute les runs dans l'ordre d'arrivée"""
+        while True:
+            async with self._condition:
+                run_id = self._claim_next()
+                while run_id is None:
+                    # Un run terminé dans un autre processus ne réveille pas ce worker
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), JOB_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    run_id = self._claim_next()
+
+            await self._publish(run_id)
+            status, result, error = 'error', None, None
+            try:
+                result = json.dumps(await self._factories.pop(run_id)())
+                status = 'success'
+            except asyncio.CancelledError:
+                error = "Run annulé"
+                raise
+            except Exception as e:
+                print(f"Erreur lors de l'exécution du run {run_id} : {str(e)}")
+                error = str(e)
+            finally:
+                with self._connect() as db:
+                    db.execute(
+                        "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE run_id = ?",
+                        (status, result, error, time.time(), run_id)
+                    )
+                async with self._condition:
+                    self._condition.notify_all()
+            await self._publish(run_id)
+
+    async def _publish(self, run_id: str) -> None:
+        """
+        Diffuse le statut d'un run sur le canal WebSocket.
+
+        Le canal n'est pas authentifié : seuls l'identifiant, le statut, la position et
+        l'erreur sont diffusés ; le résultat se récupère via GET /designer/runs/{run_id},
+        qui vérifie le propriétaire du run.
+        """
+        try:
+            description = self.describe(self.get(run_id))
+            await manager.broadcast({
+                "type": "run_status",
+                "run_id": run_id,
+                **{key: description[key] for key in ('status', 'position', 'error') if key in description}
+            })
+        except Exception as e:
+            print(f"Error broadcasting run status: {str(e)}")
+
+    def _purge(self) -> None:
+        """Oublie les runs terminés depuis plus de result_ttl secondes"""
+        with self._connect() as db:
+            db.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (time.time() - self.result_ttl,)
+            )
+
+job_manager = JobManager()
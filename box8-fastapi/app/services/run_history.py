@@ -0,0 +1,121 @@
+import os
+import json
+import tempfile
+from typing import Dict, Iterable, Optional, Set
+import networkx as nx
+from ..utils.hashing import hash_json, hash_text
+
+# Sous-dossier du dossier utilisateur contenant l'historique des runs
+RUN_HISTORY_DIR = ".runs"
+
+def _history_path(folder: str, name: str) -> str:
+    """Chemin du fichier d'historique d'un diagramme dans le dossier utilisateur"""
+    return os.path.join(folder, RUN_HISTORY_DIR, f"{hash_text(name)[:32]}.json")
+
+def load_run(folder: str, name: str) -> Dict:
+    """
+    Charge le dernier run enregistré d'un diagramme.
+
+    Args:
+        folder (str): Dossier de l'utilisateur
+        name (str): Nom du diagramme
+
+    Returns:
+        Dict: Run précédent ({'nodes': {clé: entrée}}), vide si aucun
+    """
+    path = _history_path(folder, name)
+    if not os.path.exists(path):
+        return {'nodes': {}}
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Historique de run illisible ({path}) : {e}")
+        return {'nodes': {}}
+
+def save_run(folder: str, name: str, run: Dict) -> None:
+    """
+    Enregistre le run d'un diagramme (écriture atomique).
+
+    Args:
+        folder (str): Dossier de l'utilisateur
+        name (str): Nom du diagramme
+        run (Dict): Run à enregistrer
+    """
+    path = _history_path(folder, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(run, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def node_signature(node: Dict, graph: nx.DiGraph, file_hash: Optional[str], llm: str) -> str:
+    """
+    Calcule la signature locale d'un nœud : ses propriétés, ses liens et son fichier.
+
+    Args:
+        node (Dict): Nœud du diagramme
+        graph (nx.DiGraph): Graphe des tâches
+        file_hash (Optional[str]): Empreinte du contenu du fichier associé
+        llm (str): LLM sélectionné pour le run
+
+    Returns:
+        str: Signature hexadécimale
+    """
+    key = node['key']
+    outgoing = []
+    predecessors = []
+    if key in graph:
+        outgoing = sorted(
+            (to_key, link.get('description', ''), link.get('expected_output', ''))
+            for _, to_key, link in graph.out_edges(key, data=True)
+        )
+        predecessors = sorted(graph.predecessors(key))
+    return hash_json({
+        'role': node.get('role', ''),
+        'goal': node.get('goal', ''),
+        'backstory': node.get('backstory', ''),
+        'file': node.get('file', ''),
+        'file_hash': file_hash,
+        'summarize': node.get('summarize', "Yes"),
+        'rag': node.get('rag', "No"),
+        'context_budget': node.get('context_budget'),
+        'outgoing': outgoing,
+        'predecessors': predecessors,
+        'llm': llm
+    })
+
+def dirty_nodes(graph: nx.DiGraph, signatures: Dict[str, str], previous: Dict, always_dirty: Iterable[str] = ()) -> Set[str]:
+    """
+    Détermine les nœuds à réexécuter : nœuds modifiés depuis le run précédent et leurs descendants.
+
+    Args:
+        graph (nx.DiGraph): Graphe des tâches
+        signatures (Dict[str, str]): Signatures actuelles par nœud
+        previous (Dict): Run précédent retourné par load_run
+        always_dirty (Iterable[str]): Nœuds à réexécuter quoi qu'il arrive
+
+    Returns:
+        Set[str]: Clés des nœuds à réexécuter
+    """
+    previous_nodes = previous.get('nodes', {})
+    changed = set(always_dirty)
+    for key, signature in signatures.items():
+        entry = previous_nodes.get(key)
+        if not entry or entry.get('signature') != signature:
+            changed.add(key)
+            continue
+        # Un nœud qui devait produire un résultat mais a échoué est rejoué
+        if key in graph and graph.out_degree(key) > 0 and entry.get('output') is None:
+            changed.add(key)
+
+    dirty = set(changed)
+    for key in changed:
+        if key in graph:
+            dirty |= nx.descendants(graph, key)
+    return dirty
@@ -0,0 +1,82 @@
+import os
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+import networkx as nx
+from crewai import Crew
+
+# Nombre maximal de nœuds exécutés simultanément au sein d'un même run
+DIAGRAM_MAX_CONCURRENCY = int(os.getenv("DIAGRAM_MAX_CONCURRENCY", "4"))
+
+# Nombre maximal de crews exécutés simultanément (threads dédiés, hors boucle d'événements)
+CREW_WORKERS = int(os.getenv("CREW_WORKERS", "8"))
+
+_crew_executor = ThreadPoolExecutor(max_workers=max(1, CREW_WORKERS), thread_name_prefix="crew")
+
+async def run_crew(crew: Crew, inputs: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Exécute un crew sans bloquer la boucle d'événements.
+
+    Le kickoff (synchrone) tourne dans un pool de threads borné, distinct du pool par
+    défaut d'asyncio : les crews longs n'y retardent pas les petites tâches (lecture de
+    cache, empreintes de fichiers). Le contexte courant (échéance des appels LLM) est
+    transmis au thread.
+
+    Args:
+        crew (Crew): Crew à exécuter
+        inputs (Optional[Dict[str, Any]]): Entrées du crew
+
+    Returns:
+        CrewOutput: Résultat du crew
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_crew_executor, functools.partial(context.run, crew.kickoff, inputs))
+
+async def run_dag(graph: nx.DiGraph, run_node: Callable[[str], Awaitable[None]], max_concurrency: Optional[int] = None) -> None:
+    """
+    Exécute un graphe acyclique en lançant chaque nœud dès que tous ses prédécesseurs sont terminés.
+
+    Les nœuds indépendants s'exécutent en parallèle, dans la limite de max_concurrency :
+    la durée totale suit le chemin critique du graphe et non plus le nombre de nœuds.
+
+    Args:
+        graph (nx.DiGraph): Graphe des tâches (doit être acyclique)
+        run_node (Callable): Coroutine exécutée pour chaque nœud
+        max_concurrency (Optional[int]): Nombre maximal de nœuds simultanés pour ce run
+
+    Raises:
+        nx.NetworkXUnfeasible: Si le graphe contient des cycles
+    """
+    if not nx.is_directed_acyclic_graph(graph):
+        raise nx.NetworkXUnfeasible("Le graphe contient des cycles.")
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency or DIAGRAM_MAX_CONCURRENCY))
+    remaining = {node: graph.in_degree(node) for node in graph.nodes}
+    ready = [node for node in nx.topological_sort(graph) if remaining[node] == 0]
+    running: Dict[asyncio.Task, str] = {}
+
+    async def guarded(node: str) -> None:
+        async with semaphore:
+            await run_node(node)
+
+    try:
+        while ready or running:
+            for node in ready:
+                running[asyncio.create_task(guarded(node))] = node
+            ready = []
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                node = running.pop(task)
+                # Propage l'erreur éventuelle du nœud
+                task.result()
+                for successor in graph.successors(node):
+                    remaining[successor] -= 1
+                    if remaining[successor] == 0:
+                        ready.append(successor)
+    finally:
+        for task in running:
+            task.cancel()
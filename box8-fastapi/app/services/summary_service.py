@@ -0,0 +1,88 @@
+import os
+from typing import Dict, Optional
+from ..utils.cache_store import DiskCache
+from ..utils.hashing import hash_json
+
+# Stockage partagé des résumés de documents, indexé par contenu et non par chemin
+SUMMARY_STORE_PATH = os.getenv("SUMMARY_STORE_PATH", "cache/summaries.db")
+SUMMARY_STORE_MAX_BYTES = int(os.getenv("SUMMARY_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Version du format de clé : à incrémenter si la façon de résumer change
+SUMMARY_STORE_VERSION = 1
+
+# Paramètres associés aux résumés repris des anciens fichiers <document>.txt
+LEGACY_SUMMARY_PARAMS = {'legacy': 'sidecar'}
+
+summary_store = DiskCache(SUMMARY_STORE_PATH, SUMMARY_STORE_MAX_BYTES)
+
+def summary_key(doc_hash: str, params: Dict) -> str:
+    """
+    Calcule la clé d'un résumé.
+
+    Args:
+        doc_hash (str): Empreinte du contenu du document
+        params (Dict): Paramètres du résumé (LLM, pages, découpage)
+
+    Returns:
+        str: Clé hexadécimale
+    """
+    return hash_json({'version': SUMMARY_STORE_VERSION, 'doc': doc_hash, 'params': params})
+
+def lookup_summary(doc_hash: str, params: Optional[Dict] = None) -> Optional[str]:
+    """
+    Recherche le résumé d'un document.
+
+    Args:
+        doc_hash (str): Empreinte du contenu du document
+        params (Optional[Dict]): Paramètres du résumé ; None pour le résumé le plus récent,
+            quels que soient le LLM et les paramètres utilisés
+
+    Returns:
+        Optional[str]: Résumé, ou None s'il n'a pas encore été généré
+    """
+    if params is None:
+        return summary_store.latest(doc_hash)
+    return summary_store.get(summary_key(doc_hash, params))
+
+def store_summary(doc_hash: str, params: Dict, summary: str) -> None:
+    """
+    Enregistre le résumé d'un document.
+
+    Args:
+        doc_hash (str): Empreinte du contenu du document
+        params (Dict): Paramètres du résumé
+        summary (str): Résumé généré
+    """
+    summary_store.set(summary_key(doc_hash, params), summary, tag=doc_hash)
+
+def import_legacy_summary(path: str, doc_hash: str) -> Optional[str]:
+    """
+    Reprend le résumé d'un fichier <document>.txt écrit avant le stockage partagé.
+
+    Le fichier n'est repris que s'il est plus récent que le document ; il est alors
+    enregistré dans le stockage sous l'empreinte du document.
+
+    Args:
+        path (str): Chemin du document
+        doc_hash (str): Empreinte du contenu du document
+
+    Returns:
+        Optional[str]: Résumé repris, ou None s'il n'y en a pas
+    """
+    legacy_path = f"{path}.txt"
+    try:
+        if os.path.getmtime(legacy_path) < os.path.getmtime(path):
+            return None
+        with open(legacy_path, "r", encoding="utf-8") as file:
+            summary = file.read()
+    except OSError:
+        return None
+    if not summary:
+        return None
+    store_summary(doc_hash, LEGACY_SUMMARY_PARAMS, summary)
+    print(f"Résumé {legacy_path} repris dans le stockage des résumés")
+    return summary
+
+def summary_store_stats() -> Dict:
+    """Retourne les statistiques du stockage des résumés"""
+    return summary_store.stats()
@@ -0,0 +1,170 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+class DiskCache:
+    """
+    Cache clé/valeur persistant sur SQLite avec éviction LRU bornée en taille.
+
+    Les valeurs sont des chaînes. Chaque entrée peut porter une étiquette (par exemple
+    l'empreinte du document d'origine) permettant de la retrouver ou de la supprimer.
+    """
+
+    def __init__(self, path: str, max_bytes: int, ttl: Optional[float] = None):
+        """
+        Args:
+            path (str): Chemin du fichier SQLite
+            max_bytes (int): Taille totale maximale des valeurs stockées
+            ttl (Optional[float]): Durée de vie des entrées en secondes (None pour illimitée)
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self):
+        """Gestionnaire de contexte pour les connexions à la base du cache"""
+        if not self._initialized:
+            self._init_db()
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def _init_db(self) -> None:
+        """Crée le fichier et la table du cache s'ils n'existent pas"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                tag TEXT,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+            ''')
+            db.execute('CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed)')
+            db.execute('CREATE INDEX IF NOT EXISTS idx_entries_tag ON entries (tag)')
+            db.commit()
+        finally:
+            db.close()
+        self._initialized = True
+
+    def get(self, key: str, ttl: Optional[float] = None) -> Optional[str]:
+        """
+        Récupère une valeur et la marque comme récemment utilisée.
+
+        Args:
+            key (str): Clé de l'entrée
+            ttl (Optional[float]): Durée de vie à appliquer (par défaut celle du cache)
+
+        Returns:
+            Optional[str]: Valeur stockée, ou None si absente ou expirée
+        """
+        ttl = ttl if ttl is not None else self.ttl
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute('SELECT value, created FROM entries WHERE key = ?', (key,)).fetchone()
+            if row and ttl is not None and now - row[1] > ttl:
+                db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                db.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+            db.commit()
+        self.hits += 1
+        return row[0]
+
+    def set(self, key: str, value: str, tag: Optional[str] = None) -> None:
+        """
+        Enregistre une valeur puis évince les entrées les moins récemment utilisées si besoin.
+
+        Args:
+            key (str): Clé de l'entrée
+            value (str): Valeur à stocker
+            tag (Optional[str]): Étiquette facultative associée à l'entrée
+        """
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock, self._connect() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO entries (key, value, tag, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)',
+                (key, value, tag, size, now, now)
+            )
+            self._evict(db)
+            db.commit()
+
+    def latest(self, tag: str) -> Optional[str]:
+        """
+        Récupère la valeur la plus récemment enregistrée pour une étiquette.
+
+        Args:
+            tag (str): Étiquette recherchée
+
+        Returns:
+            Optional[str]: Valeur la plus récente, ou None si aucune
+        """
+        with self._connect() as db:
+            row = db.execute(
+                'SELECT key, value, created FROM entries WHERE tag = ? ORDER BY created DESC LIMIT 1',
+                (tag,)
+            ).fetchone()
+            if row and self.ttl is not None and time.time() - row[2] > self.ttl:
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute('UPDATE entries SET accessed = ? WHERE key = ?', (time.time(), row[0]))
+            db.commit()
+        self.hits += 1
+        return row[1]
+
+    def delete(self, key: str) -> None:
+        """Supprime une entrée"""
+        with self._lock, self._connect() as db:
+            db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            db.commit()
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        """Supprime les entrées les moins récemment utilisées au-delà de max_bytes"""
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute('SELECT key, size FROM entries ORDER BY accessed ASC').fetchall():
+            if total <= self.max_bytes:
+                break
+            db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            total -= size
+
+    def stats(self) -> Dict:
+        """
+        Retourne les statistiques d'utilisation du cache.
+
+        Returns:
+            Dict: Nombre d'entrées, taille totale, hits et misses
+        """
+        with self._connect() as db:
+            count, total = db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return {
+            'entries': count,
+            'size': total,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses
+        }
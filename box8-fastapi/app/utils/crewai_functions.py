@@ -1,18 +1,20 @@
 import os
+import threading
 from crewai import LLM, Agent, Task, Crew
-from crewai_tools import (PDFSearchTool,
-                         DOCXSearchTool,
-                         TXTSearchTool,
-                         CSVSearchTool)
-import chromadb
-from chromadb.config import Settings
-from typing import Optional
+from typing import Dict, Optional, Tuple
 import requests
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+from .vector_index import get_document_tool
+from .llm_health import LLMHealthMonitor
+from .hashing import hash_json
+from .llm_cache import LLM_RESPONSE_CACHE, with_response_cache
+from .rate_limiter import set_call_observer, with_rate_limit
+from .hedging import set_secondary_resolver, with_hedging
+
 # Configuration globale des LLMs
 llm_configs = {
     "local": {
@@ -36,6 +38,35 @@ llm_configs = {
     }
 }
 
+# Délai maximal d'une vérification de disponibilité d'un LLM local (secondes)
+LLM_HEALTH_TIMEOUT = float(os.getenv("LLM_HEALTH_TIMEOUT", "2"))
+
+# Fenêtre de contexte (en tokens) de chaque modèle configuré
+llm_context_windows = {
+    "local": 8192,
+    "openai": 8192,
+    "mistral": 32000,
+    "groq": 32768
+}
+
+# Part de la fenêtre de contexte allouée au texte d'un morceau de document
+CHUNK_CONTEXT_RATIO = float(os.getenv("CHUNK_CONTEXT_RATIO", "0.5"))
+
+def get_chunk_token_budget(name: str) -> int:
+    """
+    Calcule le budget de tokens d'un morceau de document pour un LLM donné.
+
+    Args:
+        name (str): Nom du LLM (clé de llm_configs)
+
+    Returns:
+        int: Nombre maximal de tokens de texte par morceau
+    """
+    override = int(os.getenv("SUMMARY_CHUNK_TOKENS", "0"))
+    if override > 0:
+        return override
+    return int(llm_context_windows.get(name, 8192) * CHUNK_CONTEXT_RATIO)
+
 def check_llm_availability(config: dict) -> bool:
     """
     Check if an LLM is available and properly configured.
@@ -54,7 +85,7 @@ def check_llm_availability(config: dict) -> bool:
         # For local models, check if the service is running
         if config.get("base_url", "").startswith("http://localhost"):
             try:
-                response = requests.get(config["base_url"])
+                response = requests.get(config["base_url"], timeout=LLM_HEALTH_TIMEOUT)
                 return response.status_code == 200
             except requests.RequestException:
                 return False
@@ -63,19 +94,28 @@ def check_llm_availability(config: dict) -> bool:
     except Exception:
         return False
 
+# Ordre de préférence des LLMs
+llm_priority_order = ["local", "openai", "mistral", "groq"]
+
+# Instances de LLM partagées, par nom : (empreinte de la configuration, instance)
+_llm_pool: Dict[str, Tuple[str, LLM]] = {}
+_llm_pool_lock = threading.Lock()
+
+# Disponibilité des LLMs, vérifiée en tâche de fond (voir main.py)
+llm_health_monitor = LLMHealthMonitor(llm_configs, check_llm_availability)
+# Les appels réels aux LLMs alimentent aussi les disjoncteurs
+set_call_observer(llm_health_monitor.record_call)
+
 def get_available_llm() -> Optional[str]:
     """
     Get the first available LLM from the configuration.
+
+    Availability comes from the table maintained by llm_health_monitor: no network call is made here.
     
     Returns:
         Optional[str]: Name of the first available LLM, or None if none are available
     """
-    priority_order = ["local", "openai", "mistral", "groq"]
-    
-    for llm_name in priority_order:
-        if llm_name in llm_configs and check_llm_availability(llm_configs[llm_name]):
-            return llm_name
-    return None
+    return llm_health_monitor.available(llm_priority_order)
 
 def choose_llm(name: str = "") -> LLM:
     """
@@ -99,7 +139,7 @@ def choose_llm(name: str = "") -> LLM:
     if not config:
         raise ValueError(f"Unknown LLM: {name}")
         
-    if not check_llm_availability(config):
+    if not llm_health_monitor.is_available(name):
         available_llm = get_available_llm()
         if not available_llm:
             raise RuntimeError("No LLM available. Please check your configuration and API keys.")
@@ -107,28 +147,61 @@ def choose_llm(name: str = "") -> LLM:
         name = available_llm
         config = llm_configs[name]
     
-    return LLM(**config)
+    return get_pooled_llm(name, config)
 
-def reset_chroma() -> bool:
+def get_pooled_llm(name: str, config: dict) -> LLM:
     """
-    Réinitialise la base de données ChromaDB.
-    
+    Retourne l'instance partagée du LLM correspondant à une configuration.
+
+    Une instance (et donc son client HTTP et ses connexions persistantes) est créée une
+    seule fois par LLM, puis partagée entre agents, tâches et runs. Elle est recréée si
+    la configuration change. Ses appels passent par le limiteur du fournisseur (débit et
+    concurrence), sont soumis à l'échéance de la tâche et peuvent être doublés vers un
+    autre fournisseur (voir hedging.py) ; le cache des réponses, s'il est actif, est
+    consulté en premier et n'enregistre que les réponses du LLM lui-même.
+
+    Args:
+        name (str): Nom du LLM (clé de llm_configs)
+        config (dict): Configuration du LLM
+
     Returns:
-        bool: True si la réinitialisation a réussi, False sinon
+        LLM: Instance partagée
     """
-    path = "db/"
-    if os.path.isdir(path):
-        client = chromadb.PersistentClient(path=path, settings=Settings(allow_reset=True))
-        client.reset()
-        state = True
-    else:
-        state = False
-    print(f"Chromadb reset : {state}")
-    return state
+    signature = hash_json(config)
+    with _llm_pool_lock:
+        entry = _llm_pool.get(name)
+        if entry is None or entry[0] != signature:
+            if entry is not None:
+                print(f"Configuration du LLM {name} modifiée, nouvelle instance")
+            llm = with_hedging(with_rate_limit(LLM(**config), name), name)
+            if LLM_RESPONSE_CACHE:
+                llm = with_response_cache(llm)
+            entry = (signature, llm)
+            _llm_pool[name] = entry
+    return entry[1]
+
+def get_secondary_llm(name: str) -> Optional[Tuple[str, LLM]]:
+    """
+    Choisit le LLM de secours d'un appel trop lent ou en échec.
+
+    Args:
+        name (str): Nom du LLM appelé
+
+    Returns:
+        Optional[Tuple[str, LLM]]: Nom et instance partagée du premier autre LLM disponible, ou None
+    """
+    secondary = llm_health_monitor.available([other for other in llm_priority_order if other != name])
+    if secondary is None:
+        return None
+    return secondary, get_pooled_llm(secondary, llm_configs[secondary])
+
+set_secondary_resolver(get_secondary_llm)
 
 def choose_tool(src: str):
     """
     Sélectionne et instancie l'outil approprié en fonction de l'extension du fichier.
+
+    L'outil interroge l'index persistant du document, créé lors de sa première utilisation.
     
     Args:
         src (str): Chemin vers le fichier source
@@ -147,15 +220,9 @@ def choose_tool(src: str):
     # Obtenir l'extension en minuscules
     extension = os.path.splitext(src)[1].lower()
     
-    # Définir les correspondances entre extensions et outils
-    if extension == '.pdf':
-        return PDFSearchTool(pdf=src)
-    elif extension == '.docx':
-        return DOCXSearchTool(docx=src)
-    elif extension == '.txt':
-        return TXTSearchTool(txt=src)
-    elif extension == '.csv':
-        return CSVSearchTool(csv=src)
+    # Chaque document dispose de sa propre collection, indexée une seule fois par contenu
+    if extension in ('.pdf', '.docx', '.txt', '.csv'):
+        return get_document_tool(src)
     else:
         supported_extensions = ['.pdf', '.docx', '.txt', '.csv']
         raise ValueError(
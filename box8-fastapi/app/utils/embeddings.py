@@ -0,0 +1,222 @@
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils.embedding_functions import register_embedding_function
+from .hashing import hash_text
+
+# Fournisseur des embeddings : "openai" (API) ou "local" (modèle MiniLM ONNX sur CPU, hors ligne)
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+# Modèle d'embedding du fournisseur "openai"
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# Nombre de chunks envoyés par appel au modèle d'embedding
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# Nombre de lots calculés simultanément
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+# Dossier du cache des vecteurs (un sous-dossier par modèle)
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "cache/embeddings")
+
+class VectorStore:
+    """
+    Stockage persistant de vecteurs float32, indexés par empreinte de chunk.
+
+    Les vecteurs sont ajoutés bout à bout dans un fichier binaire plat (une ligne de
+    dim float32 par vecteur) lu par projection mémoire ; une table SQLite associe chaque
+    empreinte à sa ligne.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory (str): Dossier du stockage
+        """
+        self.directory = directory
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.index_path = os.path.join(directory, "index.db")
+        self.dim: Optional[int] = None
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self):
+        """Gestionnaire de contexte pour les connexions à l'index du stockage"""
+        if not self._initialized:
+            self._init_db()
+        db = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def _init_db(self) -> None:
+        """Crée le dossier et les tables du stockage s'ils n'existent pas"""
+        os.makedirs(self.directory, exist_ok=True)
+        db = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute('CREATE TABLE IF NOT EXISTS vectors (hash TEXT PRIMARY KEY, row INTEGER NOT NULL)')
+            db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            db.commit()
+            row = db.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+            self.dim = int(row[0]) if row else None
+        finally:
+            db.close()
+        self._initialized = True
+
+    def get_many(self, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Récupère les vecteurs connus parmi une liste d'empreintes.
+
+        Args:
+            hashes (List[str]): Empreintes recherchées
+
+        Returns:
+            Dict[str, np.ndarray]: Vecteurs trouvés, par empreinte
+        """
+        if not hashes:
+            return {}
+        rows = {}
+        with self._connect() as db:
+            for start in range(0, len(hashes), 500):
+                part = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows.update(db.execute(
+                    f'SELECT hash, row FROM vectors WHERE hash IN ({placeholders})', part
+                ).fetchall())
+        if not rows or self.dim is None:
+            return {}
+        count = os.path.getsize(self.vectors_path) // (4 * self.dim)
+        matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+        return {key: np.array(matrix[row]) for key, row in rows.items() if row < count}
+
+    def put_many(self, vectors: Dict[str, np.ndarray]) -> None:
+        """
+        Ajoute des vecteurs au stockage.
+
+        Args:
+            vectors (Dict[str, np.ndarray]): Vecteurs à enregistrer, par empreinte
+        """
+        if not vectors:
+            return
+        keys = list(vectors)
+        matrix = np.asarray([vectors[key] for key in keys], dtype=np.float32)
+        with self._lock, self._connect() as db:
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Dimension des vecteurs inattendue : {matrix.shape[1]} au lieu de {self.dim}")
+            # Les vecteurs sont écrits avant l'index : une interruption ne laisse que des octets inutilisés
+            with open(self.vectors_path, "ab") as file:
+                first_row = file.tell() // (4 * self.dim)
+                file.write(matrix.tobytes())
+            db.executemany(
+                'INSERT OR REPLACE INTO vectors (hash, row) VALUES (?, ?)',
+                [(key, first_row + offset) for offset, key in enumerate(keys)]
+            )
+            db.commit()
+
+    def stats(self) -> Dict:
+        """Retourne le nombre de vecteurs et la taille du stockage"""
+        with self._connect() as db:
+            count = db.execute('SELECT COUNT(*) FROM vectors').fetchone()[0]
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        return {'vectors': count, 'dim': self.dim, 'size': size}
+
+class EmbeddingService:
+    """
+    Calcul des embeddings par lots, avec déduplication et cache disque des vecteurs.
+
+    Un chunk déjà vectorisé par le même modèle, pour n'importe quel document, n'est
+    jamais renvoyé au modèle.
+    """
+
+    def __init__(self, provider: str = EMBEDDING_PROVIDER, model: str = EMBEDDING_MODEL,
+                 batch_size: int = EMBEDDING_BATCH_SIZE, concurrency: int = EMBEDDING_CONCURRENCY,
+                 cache_dir: str = EMBEDDING_CACHE_DIR):
+        self.provider = provider
+        self.model = model if provider != "local" else "all-MiniLM-L6-v2"
+        self.model_id = f"{self.provider}:{self.model}"
+        self.batch_size = max(1, batch_size)
+        self.store = VectorStore(os.path.join(cache_dir, hash_text(self.model_id)[:16]))
+        self.hits = 0
+        self.misses = 0
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="embedding")
+        self._backend = None
+        self._backend_lock = threading.Lock()
+
+    def _get_backend(self):
+        """Instancie la fonction d'embedding du fournisseur au premier usage"""
+        with self._backend_lock:
+            if self._backend is None:
+                if self.provider == "local":
+                    from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+                    self._backend = DefaultEmbeddingFunction()
+                elif self.provider == "openai":
+                    from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+                    self._backend = OpenAIEmbeddingFunction(
+                        api_key=os.getenv("OPENAI_API_KEY"),
+                        model_name=self.model
+                    )
+                else:
+                    raise ValueError(f"Fournisseur d'embeddings inconnu : {self.provider}")
+            return self._backend
+
+    def _embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """Calcule les embeddings d'un lot de textes"""
+        return [np.asarray(vector, dtype=np.float32) for vector in self._get_backend()(texts)]
+
+    def embed(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Retourne les embeddings d'une liste de textes, dans l'ordre.
+
+        Args:
+            texts (List[str]): Textes à vectoriser
+
+        Returns:
+            List[np.ndarray]: Vecteurs float32
+        """
+        keys = [hash_text(text) for text in texts]
+        unique = dict(zip(keys, texts))
+        vectors = self.store.get_many(list(unique))
+        missing = [(key, text) for key, text in unique.items() if key not in vectors]
+        self.hits += len(unique) - len(missing)
+        self.misses += len(missing)
+
+        batches = [missing[start:start + self.batch_size] for start in range(0, len(missing), self.batch_size)]
+        for batch, embedded in zip(batches, self._executor.map(lambda batch: self._embed_batch([text for _, text in batch]), batches)):
+            computed = {key: vector for (key, _), vector in zip(batch, embedded)}
+            self.store.put_many(computed)
+            vectors.update(computed)
+        return [vectors[key] for key in keys]
+
+    def stats(self) -> Dict:
+        """Retourne les statistiques du service d'embedding"""
+        return {'model': self.model_id, 'hits': self.hits, 'misses': self.misses, **self.store.stats()}
+
+embedding_service = EmbeddingService()
+
+@register_embedding_function
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Fonction d'embedding ChromaDB s'appuyant sur le service d'embedding partagé"""
+
+    def __init__(self, service: Optional[EmbeddingService] = None):
+        self.service = service or embedding_service
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self.service.embed(list(input))
+
+    @staticmethod
+    def name() -> str:
+        return "box8_cached"
+
+    def get_config(self) -> Dict:
+        return {"model_id": self.service.model_id}
+
+    @staticmethod
+    def build_from_config(config: Dict) -> "CachedEmbeddingFunction":
+        return CachedEmbeddingFunction()
@@ -0,0 +1,68 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Any, Dict, Tuple
+
+# Empreintes déjà calculées : chemin -> ((taille, date de modification), empreinte)
+_file_hashes: Dict[str, Tuple[Tuple[int, int], str]] = {}
+_file_hashes_lock = threading.Lock()
+
+def hash_text(*parts: str) -> str:
+    """
+    Calcule l'empreinte SHA-256 d'une suite de chaînes.
+
+    Args:
+        *parts (str): Chaînes à combiner
+
+    Returns:
+        str: Empreinte hexadécimale
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+def hash_json(data: Any) -> str:
+    """
+    Calcule l'empreinte SHA-256 d'une structure JSON sous forme canonique.
+
+    Args:
+        data (Any): Données sérialisables en JSON
+
+    Returns:
+        str: Empreinte hexadécimale
+    """
+    canonical = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def hash_file(path: str) -> str:
+    """
+    Calcule l'empreinte SHA-256 du contenu d'un fichier.
+
+    Le résultat est mémorisé tant que la taille et la date de modification du fichier
+    ne changent pas.
+
+    Args:
+        path (str): Chemin du fichier
+
+    Returns:
+        str: Empreinte hexadécimale
+    """
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    with _file_hashes_lock:
+        cached = _file_hashes.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    result = digest.hexdigest()
+
+    with _file_hashes_lock:
+        _file_hashes[path] = (signature, result)
+    return result
@@ -0,0 +1,279 @@
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, ClassVar, Deque, Dict, Optional, Tuple
+from .rate_limiter import CallAbandon, run_abandonable
+
+# Appels de secours (« hedging ») vers un autre fournisseur quand un appel tarde (désactivé par défaut)
+LLM_HEDGING = os.getenv("LLM_HEDGING", "0") == "1"
+# Percentile de latence du fournisseur au-delà duquel un appel est doublé
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# Nombre minimal de mesures avant d'utiliser le percentile, et délai utilisé en attendant (secondes)
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "30"))
+# Délai minimal avant de doubler un appel (secondes)
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "5"))
+# Délai maximal par défaut d'une tâche de diagramme (secondes, 0 : aucun)
+LLM_TASK_DEADLINE = float(os.getenv("LLM_TASK_DEADLINE", "0"))
+
+# Échéance (horloge monotone) des appels LLM du contexte courant
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_deadline", default=None)
+# Vrai pendant un appel de secours, qui ne doit pas être doublé à son tour
+_in_hedge: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_in_hedge", default=False)
+# Fournisseur de secours ayant fourni la réponse du dernier appel du contexte courant
+_winner: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("llm_hedge_winner", default=None)
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_HEDGE_WORKERS", "16")), thread_name_prefix="llm-hedge")
+_latencies: Dict[str, Deque[float]] = {}
+_latencies_lock = threading.Lock()
+_secondary_resolver: Optional[Callable[[str], Optional[Tuple[str, Any]]]] = None
+_stats = {'hedged': 0, 'hedge_wins': 0, 'failovers': 0, 'deadlines': 0}
+
+@contextmanager
+def llm_deadline(seconds: Optional[float]):
+    """
+    Impose une échéance aux appels LLM effectués dans le bloc (y compris par les crews lancés).
+
+    Args:
+        seconds (Optional[float]): Durée maximale en secondes (None ou 0 : pas d'échéance)
+    """
+    if not seconds:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def set_secondary_resolver(resolver: Callable[[str], Optional[Tuple[str, Any]]]) -> None:
+    """
+    Définit la fonction qui choisit le fournisseur de secours d'un LLM.
+
+    Args:
+        resolver (Callable): Fonction (nom du LLM) -> (nom, instance) du secours, ou None
+    """
+    global _secondary_resolver
+    _secondary_resolver = resolver
+
+def record_latency(name: str, latency: float) -> None:
+    """Enregistre la durée d'un appel réussi d'un fournisseur (ou un minorant, s'il a été devancé)"""
+    with _latencies_lock:
+        _latencies.setdefault(name, deque(maxlen=200)).append(latency)
+
+def hedge_delay(name: str) -> float:
+    """
+    Délai au-delà duquel un appel au fournisseur est doublé.
+
+    Args:
+        name (str): Nom du LLM
+
+    Returns:
+        float: Délai en secondes
+    """
+    with _latencies_lock:
+        samples = sorted(_latencies.get(name, ()))
+    if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+        return LLM_HEDGE_DEFAULT_DELAY
+    index = min(len(samples) - 1, int(len(samples) * LLM_HEDGE_PERCENTILE / 100))
+    return max(LLM_HEDGE_MIN_DELAY, samples[index])
+
+def hedge_winner() -> Optional[str]:
+    """
+    Indique qui a répondu au dernier appel LLM du contexte courant.
+
+    Returns:
+        Optional[str]: Nom du fournisseur de secours, ou None si la réponse vient du LLM appelé
+    """
+    return _winner.get()
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    """Temps restant avant l'échéance (None si aucune)"""
+    return None if deadline is None else deadline - time.monotonic()
+
+def _deadline_error(name: str) -> TimeoutError:
+    _stats['deadlines'] += 1
+    return TimeoutError(f"Délai de la tâche dépassé pour l'appel au LLM {name}")
+
+def _hedging_active() -> bool:
+    """Indique si l'appel courant peut être doublé"""
+    return LLM_HEDGING and not _in_hedge.get() and _secondary_resolver is not None
+
+def _secondary(name: str) -> Optional[Tuple[str, Any]]:
+    """Fournisseur de secours, si le mode est actif et qu'un autre LLM est disponible"""
+    return _secondary_resolver(name) if _hedging_active() else None
+
+def _run_secondary(llm: Any, method: str, messages: Any, args: tuple, kwargs: Dict) -> Any:
+    """Appelle le LLM de secours en marquant l'appel comme tel"""
+    _in_hedge.set(True)
+    return getattr(llm, method)(messages, *args, **kwargs)
+
+class HedgedLLMMixin:
+    """
+    Surcharge de call/acall : échéance par tâche, appel doublé vers un autre fournisseur
+    au-delà du percentile de latence, bascule immédiate en cas d'échec. La première
+    réponse obtenue est retenue.
+    """
+
+    hedge_provider: ClassVar[str] = ""
+
+    def call(self, messages, *args, **kwargs):
+        """
+        Version bloquante : les appels sont exécutés dans des threads, qui ne peuvent pas
+        être interrompus. Un appel abandonné (échéance dépassée, autre réponse retenue)
+        est signalé au limiteur du fournisseur, qui libère aussitôt sa place.
+        """
+        name = self.hedge_provider
+        deadline = _deadline.get()
+        _winner.set(None)
+        # Un appel de secours est déjà surveillé par l'appel qui l'a lancé
+        if _in_hedge.get() or (deadline is None and not _hedging_active()):
+            return self._timed_call(name, messages, args, kwargs)
+
+        futures = {}
+        signals = {}
+
+        def submit(role: str, function: Callable, *call_args) -> None:
+            signal = CallAbandon()
+            future = _executor.submit(contextvars.copy_context().run, run_abandonable, signal, function, *call_args)
+            futures[future] = role
+            signals[future] = signal
+
+        primary_call = super().call
+        started = time.monotonic()
+        submit('primary', lambda: primary_call(messages, *args, **kwargs))
+        hedge_at = started + hedge_delay(name)
+        hedged = not _hedging_active()
+        secondary_name = None
+        error: Optional[BaseException] = None
+        try:
+            while True:
+                timeouts = [t for t in (_remaining(deadline), None if hedged else hedge_at - time.monotonic()) if t is not None]
+                done, _ = wait(list(futures), timeout=max(0, min(timeouts)) if timeouts else None, return_when=FIRST_COMPLETED)
+                for future in done:
+                    role = futures.pop(future)
+                    if future.exception() is None:
+                        if role == 'primary':
+                            record_latency(name, time.monotonic() - started)
+                        else:
+                            self._secondary_won(name, secondary_name, started, 'primary' in futures.values())
+                        return future.result()
+                    error = future.exception()
+                remaining = _remaining(deadline)
+                if remaining is not None and remaining <= 0:
+                    raise _deadline_error(name)
+                if not hedged and (not futures or time.monotonic() >= hedge_at):
+                    hedged = True
+                    secondary = _secondary(name)
+                    if secondary is not None:
+                        _stats['failovers' if not futures else 'hedged'] += 1
+                        print(f"Appel au LLM {name} {'en échec' if not futures else 'trop long'}, secours : {secondary[0]}")
+                        secondary_name = secondary[0]
+                        submit('secondary', _run_secondary, secondary[1], 'call', messages, args, kwargs)
+                if not futures:
+                    raise error
+        finally:
+            # Les appels perdants ne peuvent pas être interrompus : leurs places sont libérées
+            for future in futures:
+                signals[future].abandon()
+
+    @staticmethod
+    def _secondary_won(name: str, secondary_name: str, started: float, primary_pending: bool) -> None:
+        """
+        Enregistre la victoire du secours. Si l'appel principal était encore en cours, sa
+        durée écoulée est un minorant de sa latence : l'enregistrer évite que le percentile
+        du fournisseur lent reste indéfiniment à sa valeur par défaut.
+        """
+        _stats['hedge_wins'] += 1
+        _winner.set(secondary_name)
+        if primary_pending:
+            record_latency(name, time.monotonic() - started)
+
+    def _timed_call(self, name: str, messages, args: tuple, kwargs: Dict):
+        """Appel direct, dont la durée alimente les statistiques de latence"""
+        started = time.monotonic()
+        result = super().call(messages, *args, **kwargs)
+        record_latency(name, time.monotonic() - started)
+        return result
+
+    async def acall(self, messages, *args, **kwargs):
+        name = self.hedge_provider
+        deadline = _deadline.get()
+        _winner.set(None)
+        started = time.monotonic()
+        tasks = {asyncio.ensure_future(super().acall(messages, *args, **kwargs)): 'primary'}
+        hedge_at = started + hedge_delay(name)
+        hedged = not _hedging_active()
+        secondary_name = None
+        error: Optional[BaseException] = None
+        try:
+            while True:
+                timeouts = [t for t in (_remaining(deadline), None if hedged else hedge_at - time.monotonic()) if t is not None]
+                done, _ = await asyncio.wait(list(tasks), timeout=max(0, min(timeouts)) if timeouts else None, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    role = tasks.pop(task)
+                    if task.exception() is None:
+                        if role == 'primary':
+                            record_latency(name, time.monotonic() - started)
+                        else:
+                            self._secondary_won(name, secondary_name, started, 'primary' in tasks.values())
+                        return task.result()
+                    error = task.exception()
+                remaining = _remaining(deadline)
+                if remaining is not None and remaining <= 0:
+                    raise _deadline_error(name)
+                if not hedged and (not tasks or time.monotonic() >= hedge_at):
+                    hedged = True
+                    secondary = _secondary(name)
+                    if secondary is not None:
+                        _stats['failovers' if not tasks else 'hedged'] += 1
+                        print(f"Appel au LLM {name} {'en échec' if not tasks else 'trop long'}, secours : {secondary[0]}")
+                        secondary_name = secondary[0]
+                        token = _in_hedge.set(True)
+                        try:
+                            tasks[asyncio.ensure_future(secondary[1].acall(messages, *args, **kwargs))] = 'secondary'
+                        finally:
+                            _in_hedge.reset(token)
+                if not tasks:
+                    raise error
+        finally:
+            # L'appel perdant est abandonné
+            for task in tasks:
+                task.cancel()
+
+_hedged_classes: Dict[tuple, type] = {}
+
+def with_hedging(llm: Any, name: str) -> Any:
+    """
+    Ajoute l'échéance par tâche et les appels de secours à une instance de LLM.
+
+    Args:
+        llm (LLM): Instance du LLM
+        name (str): Nom du LLM (clé de llm_configs)
+
+    Returns:
+        LLM: La même instance
+    """
+    cls = type(llm)
+    key = (cls, name)
+    if key not in _hedged_classes:
+        _hedged_classes[key] = type(
+            f"Hedged{cls.__name__}",
+            (HedgedLLMMixin, cls),
+            {'__annotations__': {'hedge_provider': ClassVar[str]}, 'hedge_provider': name}
+        )
+    object.__setattr__(llm, '__class__', _hedged_classes[key])
+    return llm
+
+def hedging_stats() -> Dict:
+    """Retourne les statistiques des appels de secours et les délais de déclenchement actuels"""
+    with _latencies_lock:
+        names = list(_latencies)
+    return {**_stats, 'enabled': LLM_HEDGING, 'delays': {name: round(hedge_delay(name), 2) for name in names}}
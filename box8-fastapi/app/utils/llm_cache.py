@@ -0,0 +1,131 @@
+import os
+import re
+from typing import Any, Dict, List, Optional
+from .cache_store import DiskCache
+from .hashing import hash_json
+from .hedging import hedge_winner
+
+# Cache des réponses des LLMs (désactivé par défaut)
+LLM_RESPONSE_CACHE = os.getenv("LLM_RESPONSE_CACHE", "0") == "1"
+# Mise en cache même lorsque la température est supérieure à zéro
+LLM_CACHE_FORCE = os.getenv("LLM_CACHE_FORCE", "0") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "cache/llm_responses.db")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Version du format de clé : à incrémenter si la normalisation des messages change
+LLM_CACHE_VERSION = 1
+
+response_cache = DiskCache(LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES, ttl=LLM_CACHE_TTL)
+_bypassed = 0
+
+def _normalize_messages(messages: Any) -> List[Dict[str, str]]:
+    """Forme canonique des messages : rôle et contenu, espaces superflus retirés"""
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    normalized = []
+    for message in messages:
+        content = message.get("content", "")
+        if not isinstance(content, str):
+            content = repr(content)
+        content = re.sub(r"[ \t]+", " ", content)
+        content = re.sub(r"\s*\n\s*", "\n", content).strip()
+        normalized.append({"role": message.get("role", "user"), "content": content})
+    return normalized
+
+def response_key(llm: Any, messages: Any) -> str:
+    """
+    Calcule la clé de cache d'un appel à un LLM.
+
+    Args:
+        llm (LLM): Instance du LLM appelé
+        messages (Any): Messages envoyés (chaîne ou liste de messages)
+
+    Returns:
+        str: Clé hexadécimale
+    """
+    return hash_json({
+        'version': LLM_CACHE_VERSION,
+        'model': getattr(llm, 'model', None),
+        'temperature': getattr(llm, 'temperature', None),
+        'stop': sorted(getattr(llm, 'stop', None) or []),
+        'messages': _normalize_messages(messages)
+    })
+
+def _cacheable(llm: Any, messages: Any, kwargs: Dict) -> bool:
+    """
+    Un appel n'est mis en cache que sans outils ni format imposé, et à température nulle
+    sauf forçage. Une température absente laisse le fournisseur appliquer la sienne (souvent
+    proche de 1) : l'appel est alors traité comme non déterministe.
+    """
+    global _bypassed
+    if kwargs.get('tools') or kwargs.get('available_functions') or kwargs.get('response_model'):
+        return False
+    if not isinstance(messages, (str, list)):
+        return False
+    temperature = getattr(llm, 'temperature', None)
+    if (temperature is None or temperature > 0) and not LLM_CACHE_FORCE:
+        _bypassed += 1
+        return False
+    return True
+
+class CachedLLMMixin:
+    """
+    Surcharge de call/acall servant les réponses déjà obtenues pour un prompt identique.
+
+    Une réponse fournie par un LLM de secours (voir hedging.py) n'est pas enregistrée :
+    la clé désigne le modèle appelé, pas celui qui a répondu.
+    """
+
+    def call(self, messages, *args, **kwargs):
+        if args or not _cacheable(self, messages, kwargs):
+            return super().call(messages, *args, **kwargs)
+        key = response_key(self, messages)
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+        result = super().call(messages, **kwargs)
+        if isinstance(result, str) and result and hedge_winner() is None:
+            response_cache.set(key, result, tag=getattr(self, 'model', None))
+        return result
+
+    async def acall(self, messages, *args, **kwargs):
+        if args or not _cacheable(self, messages, kwargs):
+            return await super().acall(messages, *args, **kwargs)
+        key = response_key(self, messages)
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+        result = await super().acall(messages, **kwargs)
+        if isinstance(result, str) and result and hedge_winner() is None:
+            response_cache.set(key, result, tag=getattr(self, 'model', None))
+        return result
+
+_cached_classes: Dict[type, type] = {}
+
+def with_response_cache(llm: Any) -> Any:
+    """
+    Active le cache des réponses sur une instance de LLM.
+
+    La classe de l'instance (qui dépend du fournisseur) est remplacée par une sous-classe
+    ajoutant le cache ; l'instance reste utilisable partout où un LLM est attendu.
+
+    Args:
+        llm (LLM): Instance du LLM
+
+    Returns:
+        LLM: La même instance, avec cache
+    """
+    cls = type(llm)
+    if issubclass(cls, CachedLLMMixin):
+        return llm
+    if cls not in _cached_classes:
+        _cached_classes[cls] = type(f"Cached{cls.__name__}", (CachedLLMMixin, cls), {})
+    object.__setattr__(llm, '__class__', _cached_classes[cls])
+    return llm
+
+def response_cache_stats() -> Optional[Dict]:
+    """Retourne les statistiques du cache des réponses (None s'il est désactivé)"""
+    if not LLM_RESPONSE_CACHE:
+        return None
+    return {**response_cache.stats(), 'bypassed': _bypassed}
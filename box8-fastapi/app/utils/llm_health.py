@@ -0,0 +1,194 @@
+import os
+import time
+import asyncio
+import threading
+from typing import Callable, Dict, List, Optional
+
+# Intervalle entre deux vérifications de disponibilité des LLMs (secondes)
+LLM_HEALTH_INTERVAL = float(os.getenv("LLM_HEALTH_INTERVAL", "30"))
+# Durée de validité d'un résultat de vérification (secondes)
+LLM_HEALTH_TTL = float(os.getenv("LLM_HEALTH_TTL", "120"))
+# Nombre d'échecs consécutifs ouvrant le disjoncteur d'un LLM
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "3"))
+# Durée pendant laquelle un LLM au disjoncteur ouvert est écarté (secondes)
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "60"))
+
+class LLMHealthMonitor:
+    """
+    Table de disponibilité des LLMs, tenue à jour par une tâche de fond.
+
+    La consultation (is_available) ne fait jamais d'entrée/sortie réseau. Chaque LLM
+    dispose d'un disjoncteur : après LLM_BREAKER_THRESHOLD échecs consécutifs (vérifications,
+    ou appels réels signalés par record_call depuis les LLMs partagés), il est écarté pendant LLM_BREAKER_COOLDOWN
+    secondes, puis de nouveau essayé (état semi-ouvert) ; un succès le referme.
+    """
+
+    def __init__(self, configs: Dict[str, Dict], check: Callable[[Dict], bool],
+                 interval: float = LLM_HEALTH_INTERVAL, ttl: float = LLM_HEALTH_TTL,
+                 threshold: int = LLM_BREAKER_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN):
+        """
+        Args:
+            configs (Dict[str, Dict]): Configurations des LLMs, par nom
+            check (Callable[[Dict], bool]): Vérification (bloquante) de la disponibilité d'une configuration
+            interval (float): Intervalle entre deux vérifications
+            ttl (float): Durée de validité d'un résultat
+            threshold (int): Nombre d'échecs consécutifs ouvrant le disjoncteur
+            cooldown (float): Durée d'ouverture du disjoncteur
+        """
+        self.configs = configs
+        self.check = check
+        self.interval = interval
+        self.ttl = ttl
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.table: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _entry(self, name: str) -> Dict:
+        """Entrée de la table d'un LLM, créée si besoin (appelé sous verrou)"""
+        if name not in self.table:
+            self.table[name] = {
+                'available': None,
+                'checked_at': None,
+                'failures': 0,
+                'state': 'closed',
+                'opened_at': None,
+                'error': None
+            }
+        return self.table[name]
+
+    def is_available(self, name: str) -> bool:
+        """
+        Indique si un LLM est utilisable, d'après la dernière vérification.
+
+        Un LLM jamais vérifié, ou dont le résultat a expiré, est considéré disponible :
+        c'est alors l'appel lui-même qui échouera et sera signalé.
+
+        Args:
+            name (str): Nom du LLM (clé de llm_configs)
+
+        Returns:
+            bool: True si le LLM peut être utilisé
+        """
+        config = self.configs.get(name)
+        if not config:
+            return False
+        # Clé d'API manquante : inutile d'attendre une vérification
+        if "api_key" in config and not config["api_key"]:
+            return False
+        now = time.time()
+        with self._lock:
+            entry = self._entry(name)
+            if entry['state'] == 'open':
+                if now - entry['opened_at'] < self.cooldown:
+                    return False
+                entry['state'] = 'half_open'
+            if entry['available'] is None or now - entry['checked_at'] > self.ttl:
+                return True
+            return entry['available'] or entry['state'] == 'half_open'
+
+    def record_success(self, name: str) -> None:
+        """Signale un appel ou une vérification réussi : referme le disjoncteur"""
+        with self._lock:
+            entry = self._entry(name)
+            entry.update(available=True, checked_at=time.time(), failures=0, state='closed', opened_at=None, error=None)
+
+    def record_failure(self, name: str, error: Optional[str] = None) -> None:
+        """Signale un appel ou une vérification en échec : ouvre le disjoncteur au-delà du seuil"""
+        now = time.time()
+        with self._lock:
+            entry = self._entry(name)
+            entry['available'] = False
+            entry['checked_at'] = now
+            entry['failures'] += 1
+            entry['error'] = error
+            if entry['state'] == 'half_open' or entry['failures'] >= self.threshold:
+                if entry['state'] != 'open':
+                    print(f"LLM {name} indisponible, écarté pendant {self.cooldown:.0f}s")
+                entry['state'] = 'open'
+                entry['opened_at'] = now
+
+    def _record_probe_success(self, name: str) -> None:
+        """
+        Signale une vérification réussie.
+
+        Elle ne referme pas un disjoncteur ouvert par des appels en échec avant la fin de
+        sa période d'ouverture : la vérification peut réussir (clé présente) alors que
+        le fournisseur refuse les appels.
+        """
+        with self._lock:
+            entry = self._entry(name)
+            if entry['state'] == 'open' and time.time() - entry['opened_at'] < self.cooldown:
+                entry['checked_at'] = time.time()
+                return
+        self.record_success(name)
+
+    def record_call(self, name: str, error: Optional[Exception] = None) -> None:
+        """
+        Signale le résultat d'un appel réel à un LLM.
+
+        Pour les fournisseurs à clé d'API, la vérification périodique ne contrôle que la
+        présence de la clé : ce sont les appels qui ouvrent ou referment leur disjoncteur.
+
+        Args:
+            name (str): Nom du LLM (clé de llm_configs)
+            error (Optional[Exception]): Exception levée par l'appel, None s'il a réussi
+        """
+        if error is None:
+            self.record_success(name)
+        else:
+            self.record_failure(name, str(error))
+
+    async def probe(self) -> None:
+        """Vérifie tous les LLMs configurés en parallèle, hors de la boucle d'événements"""
+        names = list(self.configs)
+        results = await asyncio.gather(*[
+            asyncio.to_thread(self.check, self.configs[name]) for name in names
+        ], return_exceptions=True)
+        for name, result in zip(names, results):
+            if result is True:
+                self._record_probe_success(name)
+            else:
+                self.record_failure(name, str(result) if isinstance(result, Exception) else "Vérification échouée")
+
+    async def _run(self) -> None:
+        """Boucle de vérification périodique"""
+        while True:
+            try:
+                await self.probe()
+            except Exception as e:
+                print(f"Erreur lors de la vérification des LLMs : {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        """Démarre la vérification périodique (sans effet si elle tourne déjà)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Arrête la vérification périodique"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Copie de la table de disponibilité"""
+        with self._lock:
+            return {name: dict(entry) for name, entry in self.table.items()}
+
+    def available(self, order: List[str]) -> Optional[str]:
+        """
+        Premier LLM disponible dans un ordre de priorité.
+
+        Args:
+            order (List[str]): Noms des LLMs par priorité décroissante
+
+        Returns:
+            Optional[str]: Nom du LLM, ou None si aucun n'est disponible
+        """
+        for name in order:
+            if self.is_available(name):
+                return name
+        return None
@@ -0,0 +1,111 @@
+import os
+import glob
+import struct
+import tempfile
+from typing import List, Optional
+from .hashing import hash_file
+
+# Sous-dossier, à côté des fichiers utilisateur, contenant le texte extrait des documents
+PAGE_CACHE_DIR = ".pages"
+
+# Format : en-tête, nombre de pages, puis pour chaque page sa longueur (octets) et son texte UTF-8
+_MAGIC = b"B8PAGES1"
+_COUNT = struct.Struct(">I")
+_LENGTH = struct.Struct(">I")
+
+def _cache_prefix(src: str) -> str:
+    """Préfixe des fichiers de cache d'un document"""
+    folder, name = os.path.split(src)
+    return os.path.join(folder, PAGE_CACHE_DIR, name)
+
+def page_cache_path(src: str, doc_hash: Optional[str] = None) -> str:
+    """
+    Chemin du fichier de cache du texte d'un document pour son contenu actuel.
+
+    Args:
+        src (str): Chemin du document
+        doc_hash (Optional[str]): Empreinte du contenu (calculée si absente)
+
+    Returns:
+        str: Chemin du fichier de cache
+    """
+    doc_hash = doc_hash or hash_file(src)
+    return f"{_cache_prefix(src)}.{doc_hash[:32]}.pages"
+
+def read_page_cache(src: str, max_pages: Optional[int] = None) -> Optional[List[str]]:
+    """
+    Lit le texte des pages d'un document depuis le cache.
+
+    Args:
+        src (str): Chemin du document
+        max_pages (Optional[int]): Nombre maximal de pages à lire (None pour toutes)
+
+    Returns:
+        Optional[List[str]]: Textes des pages, ou None si le cache est absent ou invalide
+    """
+    path = page_cache_path(src)
+    try:
+        with open(path, "rb") as file:
+            if file.read(len(_MAGIC)) != _MAGIC:
+                return None
+            (count,) = _COUNT.unpack(file.read(_COUNT.size))
+            if max_pages is not None:
+                count = min(count, max_pages)
+            pages = []
+            for _ in range(count):
+                (length,) = _LENGTH.unpack(file.read(_LENGTH.size))
+                data = file.read(length)
+                if len(data) != length:
+                    return None
+                pages.append(data.decode("utf-8"))
+            return pages
+    except FileNotFoundError:
+        return None
+    except (OSError, struct.error, UnicodeDecodeError) as e:
+        print(f"Cache de pages illisible ({path}) : {e}")
+        return None
+
+def write_page_cache(src: str, pages: List[str], doc_hash: Optional[str] = None) -> None:
+    """
+    Enregistre le texte de toutes les pages d'un document (écriture atomique).
+
+    Les caches correspondant à un contenu précédent du document sont supprimés.
+
+    Args:
+        src (str): Chemin du document
+        pages (List[str]): Textes de toutes les pages
+        doc_hash (Optional[str]): Empreinte du contenu extrait
+    """
+    path = page_cache_path(src, doc_hash)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(_MAGIC)
+            file.write(_COUNT.pack(len(pages)))
+            for page in pages:
+                data = page.encode("utf-8")
+                file.write(_LENGTH.pack(len(data)))
+                file.write(data)
+        invalidate_page_cache(src, keep=path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def invalidate_page_cache(src: str, keep: Optional[str] = None) -> None:
+    """
+    Supprime le cache du texte d'un document (à appeler quand le fichier change ou disparaît).
+
+    Args:
+        src (str): Chemin du document
+        keep (Optional[str]): Fichier de cache à conserver
+    """
+    for path in glob.glob(f"{glob.escape(_cache_prefix(src))}.*.pages"):
+        if path != keep:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Impossible de supprimer le cache de pages {path} : {e}")
@@ -1,64 +1,208 @@
 import os
+import mmap
 import shutil
+import asyncio
+import multiprocessing
 import pypdf
-import aiofiles
-from io import BytesIO
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, List, Optional, Tuple
 from pypdf import PdfWriter
 from docx import Document
+from .hashing import hash_file
+from .page_cache import read_page_cache, write_page_cache
 
-async def extract_page_text_from_file(src: str) -> list:
+# Nombre de processus dédiés à l'extraction de texte
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Nombre de pages d'un PDF traitées par une même tâche d'extraction
+EXTRACTION_PAGES_PER_TASK = int(os.getenv("EXTRACTION_PAGES_PER_TASK", "25"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Retourne le pool de processus d'extraction, créé au premier usage"""
+    global _executor
+    if _executor is None:
+        # spawn : les processus ne héritent pas de l'état (threads, boucle asyncio) du serveur
+        _executor = ProcessPoolExecutor(
+            max_workers=max(1, EXTRACTION_WORKERS),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+def shutdown_extraction_pool() -> None:
+    """Arrête le pool de processus d'extraction"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+@contextmanager
+def _open_mapped(src: str):
+    """Ouvre un fichier en lecture projetée en mémoire (les pages sont lues à la demande)"""
+    with open(src, 'rb') as file:
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Fichier vide : mmap impossible
+            yield file
+            return
+        with mapped:
+            yield mapped
+
+def _extract_pdf_pages(src: str, start: int, end: int) -> Tuple[int, List[str]]:
     """
-    Extrait le texte d'un fichier PDF ou DOCX page par page de manière asynchrone.
-    
+    Extrait le texte des pages [start, end[ d'un PDF (exécuté dans un processus du pool).
+
     Args:
-        src (str): Chemin vers le fichier source
-        
+        src (str): Chemin vers le fichier PDF
+        start (int): Index de la première page
+        end (int): Index de fin (exclu)
+
     Returns:
-        list: Liste des textes extraits par page
+        Tuple[int, List[str]]: Nombre total de pages du PDF, textes non vides des pages demandées
     """
     texte_pages = []
+    with _open_mapped(src) as stream:
+        reader = pypdf.PdfReader(stream)
+        count = len(reader.pages)
+        for page_num in range(start, min(end, count)):
+            try:
+                texte = reader.pages[page_num].extract_text()
+                if texte:
+                    texte_pages.append(texte)
+                else:
+                    print(f"Le texte de la page {page_num + 1} est vide ou illisible.")
+            except Exception as e:
+                print(f"Erreur lors de l'extraction du texte de la page {page_num + 1}: {e}")
+    return count, texte_pages
+
+def _extract_docx_pages(src: str) -> List[str]:
+    """Extrait le texte d'un DOCX par blocs de paragraphes (exécuté dans un processus du pool)"""
+    texte_pages = []
+    doc = Document(src)
+    paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
+
+    # Grouper les paragraphes par blocs de 11
+    bloc = []
+    for i, paragraphe in enumerate(paragraphs, start=1):
+        bloc.append(paragraphe)
+        if i % 11 == 0:
+            texte_pages.append("\n".join(bloc))
+            bloc = []
+
+    if bloc:
+        texte_pages.append("\n".join(bloc))
+    return texte_pages
+
+async def _run_in_pool(func, *args):
+    """Exécute une fonction dans le pool d'extraction ; un pool cassé est recréé au prochain appel"""
+    global _executor
+    loop = asyncio.get_running_loop()
     try:
-        extension = os.path.splitext(src)[1].lower()
+        return await loop.run_in_executor(_get_executor(), func, *args)
+    except BrokenProcessPool:
+        _executor = None
+        raise
 
-        if extension == '.pdf':
-            async with aiofiles.open(src, 'rb') as pdf_file:
-                file_content = await pdf_file.read()
-                # Créer un objet BytesIO à partir des bytes lus
-                pdf_bytes = BytesIO(file_content)
-                reader = pypdf.PdfReader(pdf_bytes)
-
-                for page_num, page in enumerate(reader.pages):
-                    try:
-                        texte = page.extract_text()
-                        if texte:
-                            texte_pages.append(texte)
-                        else:
-                            print(f"Le texte de la page {page_num + 1} est vide ou illisible.")
-                    except Exception as e:
-                        print(f"Erreur lors de l'extraction du texte de la page {page_num + 1}: {e}")
+async def iter_page_text_from_file(src: str, max_pages: Optional[int] = None) -> AsyncIterator[str]:
+    """
+    Itère de manière asynchrone sur le texte des pages d'un fichier PDF ou DOCX.
 
-        elif extension == '.docx':
-            try:
-                doc = Document(src)
-                paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
+    Le texte déjà extrait pour le contenu actuel du fichier est relu depuis le cache de
+    pages. Sinon, les pages sont extraites à la demande, par lots, dans le pool de
+    processus : seuls les lots nécessaires sont lus, et l'itération s'arrête dès que
+    max_pages pages (non vides) ont été produites. Les lots suivants sont préparés en
+    parallèle pendant que l'appelant consomme les premiers ; ils sont annulés si
+    l'itération s'arrête. Une extraction complète alimente le cache.
 
-                # Grouper les paragraphes par blocs de 11
-                bloc = []
-                for i, paragraphe in enumerate(paragraphs, start=1):
-                    bloc.append(paragraphe)
-                    if i % 11 == 0:
-                        texte_pages.append("\n".join(bloc))
-                        bloc = []
+    Args:
+        src (str): Chemin vers le fichier source
+        max_pages (Optional[int]): Nombre maximal de pages à produire (None pour toutes)
+
+    Yields:
+        str: Texte de chaque page, dans l'ordre
+    """
+    if max_pages is not None and max_pages <= 0:
+        return
+    doc_hash = await asyncio.to_thread(hash_file, src)
+    cached = await asyncio.to_thread(read_page_cache, src, max_pages)
+    if cached is not None:
+        for texte in cached:
+            yield texte
+        return
+
+    extracted = []
+    async for texte in _iter_extracted_pages(src, max_pages):
+        extracted.append(texte)
+        yield texte
+
+    # Document lu jusqu'au bout : le texte de toutes ses pages est mis en cache
+    if max_pages is None or len(extracted) < max_pages:
+        try:
+            await asyncio.to_thread(write_page_cache, src, extracted, doc_hash)
+        except OSError as e:
+            print(f"Impossible d'enregistrer le cache de pages de {src} : {e}")
 
-                if bloc:
-                    texte_pages.append("\n".join(bloc))
+async def _iter_extracted_pages(src: str, max_pages: Optional[int]) -> AsyncIterator[str]:
+    """Extrait les pages d'un document dans le pool de processus (voir iter_page_text_from_file)"""
+    produced = 0
+    extension = os.path.splitext(src)[1].lower()
+    try:
+        if extension == '.pdf':
+            size = EXTRACTION_PAGES_PER_TASK
+            if max_pages is not None:
+                size = min(size, max_pages)
+            size = max(1, size)
+
+            # Le premier lot donne aussi le nombre total de pages
+            count, texts = await _run_in_pool(_extract_pdf_pages, src, 0, size)
+            ranges = [(start, min(start + size, count)) for start in range(size, count, size)]
+            pending = deque()
+            try:
+                while True:
+                    # Lots suivants lancés à l'avance, dans la limite du nombre de workers
+                    while ranges and len(pending) < max(1, EXTRACTION_WORKERS):
+                        start, end = ranges.pop(0)
+                        pending.append(asyncio.ensure_future(_run_in_pool(_extract_pdf_pages, src, start, end)))
+                    for texte in texts:
+                        yield texte
+                        produced += 1
+                        if max_pages is not None and produced >= max_pages:
+                            return
+                    if not pending:
+                        return
+                    _, texts = await pending.popleft()
+            finally:
+                for future in pending:
+                    future.cancel()
 
+        elif extension == '.docx':
+            try:
+                texte_pages = await _run_in_pool(_extract_docx_pages, src)
             except Exception as e:
                 print(f"Erreur lors de la lecture du fichier DOCX : {e}")
                 raise
+            for texte in texte_pages[:max_pages]:
+                yield texte
 
+    except (asyncio.CancelledError, GeneratorExit):
+        raise
     except Exception as e:
         print(f"Erreur lors de la lecture du fichier : {e}")
         raise
 
-    return texte_pages
+async def extract_page_text_from_file(src: str, max_pages: Optional[int] = None) -> list:
+    """
+    Extrait le texte d'un fichier PDF ou DOCX page par page de manière asynchrone.
+
+    Args:
+        src (str): Chemin vers le fichier source
+        max_pages (Optional[int]): Nombre maximal de pages à extraire (None pour toutes)
+
+    Returns:
+        list: Liste des textes extraits par page
+    """
+    return [texte async for texte in iter_page_text_from_file(src, max_pages=max_pages)]
@@ -0,0 +1,464 @@
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, ClassVar, Dict, List, Optional, Set, Tuple
+from .token_utils import estimate_tokens
+
+# Nombre de tokens de réponse comptés d'avance pour un appel (ajusté si le LLM fixe max_tokens)
+LLM_OUTPUT_TOKENS_ESTIMATE = int(os.getenv("LLM_OUTPUT_TOKENS_ESTIMATE", "500"))
+# Latence au-delà de laquelle la concurrence d'un fournisseur est réduite (secondes)
+LLM_LATENCY_TARGET = float(os.getenv("LLM_LATENCY_TARGET", "30"))
+# Nombre de nouvelles tentatives après un refus pour dépassement de quota (HTTP 429)
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "3"))
+
+# Limites par fournisseur : requêtes et tokens par minute (0 : pas de limite), concurrence maximale
+provider_limits = {
+    "local": {
+        "rpm": int(os.getenv("LLM_RPM_LOCAL", "0")),
+        "tpm": int(os.getenv("LLM_TPM_LOCAL", "0")),
+        "concurrency": int(os.getenv("LLM_MAX_CONCURRENCY_LOCAL", "1"))
+    },
+    "openai": {
+        "rpm": int(os.getenv("LLM_RPM_OPENAI", "500")),
+        "tpm": int(os.getenv("LLM_TPM_OPENAI", "10000")),
+        "concurrency": int(os.getenv("LLM_MAX_CONCURRENCY_OPENAI", "8"))
+    },
+    "mistral": {
+        "rpm": int(os.getenv("LLM_RPM_MISTRAL", "60")),
+        "tpm": int(os.getenv("LLM_TPM_MISTRAL", "500000")),
+        "concurrency": int(os.getenv("LLM_MAX_CONCURRENCY_MISTRAL", "4"))
+    },
+    "groq": {
+        "rpm": int(os.getenv("LLM_RPM_GROQ", "30")),
+        "tpm": int(os.getenv("LLM_TPM_GROQ", "5000")),
+        "concurrency": int(os.getenv("LLM_MAX_CONCURRENCY_GROQ", "4"))
+    }
+}
+
+class CallAbandon:
+    """
+    Signal d'abandon d'un appel bloquant par son appelant (échéance dépassée, réponse d'un
+    autre fournisseur retenue).
+
+    Un thread ne peut pas être interrompu : l'appel en cours continue jusqu'à la réponse
+    du fournisseur, mais sa place dans le limiteur est libérée dès l'abandon, et un appel
+    encore en attente de place ou de nouvelle tentative s'arrête.
+    """
+
+    def __init__(self):
+        self.abandoned = False
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def on_abandon(self, callback: Callable[[], None]) -> None:
+        """Enregistre une fonction appelée à l'abandon (immédiatement s'il a déjà eu lieu)"""
+        with self._lock:
+            if not self.abandoned:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def discard(self, callback: Callable[[], None]) -> None:
+        """Retire une fonction enregistrée par on_abandon"""
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def abandon(self) -> None:
+        """Signale l'abandon et appelle les fonctions enregistrées"""
+        with self._lock:
+            if self.abandoned:
+                return
+            self.abandoned = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def check(self) -> None:
+        """Lève TimeoutError si l'appel a été abandonné"""
+        if self.abandoned:
+            raise TimeoutError("Appel au LLM abandonné par l'appelant")
+
+# Signal d'abandon de l'appel bloquant du contexte courant
+_call_abandon: contextvars.ContextVar[Optional[CallAbandon]] = contextvars.ContextVar("llm_call_abandon", default=None)
+
+def run_abandonable(signal: CallAbandon, function: Callable, *args, **kwargs) -> Any:
+    """
+    Exécute un appel bloquant que l'appelant pourra abandonner via signal.
+
+    À utiliser dans un contexte copié (contextvars.copy_context().run), par exemple
+    dans un thread d'un exécuteur.
+    """
+    _call_abandon.set(signal)
+    return function(*args, **kwargs)
+
+class TokenBucket:
+    """
+    Seau à jetons rechargé en continu, partagé entre threads.
+
+    Une réservation est toujours accordée mais peut rendre le solde négatif : le délai
+    retourné fait attendre chaque appelant dans l'ordre de ses réservations.
+    """
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Réserve une quantité de jetons.
+
+        Args:
+            amount (float): Nombre de jetons à consommer
+
+        Returns:
+            float: Délai d'attente (secondes) avant de pouvoir les utiliser
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Une demande plus grosse que le seau ne doit pas bloquer indéfiniment
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+def _resolve(future: asyncio.Future) -> None:
+    """Réveille un appelant asynchrone (dans sa boucle)"""
+    if not future.done():
+        future.set_result(None)
+
+class AdaptiveConcurrency:
+    """
+    Limite de concurrence ajustée selon le principe AIMD.
+
+    La limite augmente d'environ un appel par « aller-retour » tant que les appels
+    réussissent dans la latence cible, et diminue de moitié à chaque refus pour quota
+    (de 10 % en cas de latence excessive). Les appelants sont servis dans l'ordre d'arrivée.
+    C'est la seule limite de concurrence par fournisseur : elle s'applique à chaque appel,
+    tous runs et crews confondus.
+
+    Les appelants bloquants attendent sur une condition ; les appelants asynchrones sur un
+    futur de leur boucle, résolu à chaque libération de place (sans attente active).
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(self.max_limit)
+        self.inflight = 0
+        self._next_ticket = 0
+        self._serving = 0
+        # Tickets d'appelants partis avant d'être servis (attente annulée), sautés par la file
+        self._abandoned: Set[int] = set()
+        self._condition = threading.Condition()
+        # Appelants asynchrones en attente : ticket -> (boucle, futur à résoudre)
+        self._async_waiters: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+
+    def _take_ticket(self) -> int:
+        with self._condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            return ticket
+
+    def _notify(self) -> None:
+        """Réveille tous les appelants en attente, bloquants et asynchrones (sous verrou)"""
+        self._condition.notify_all()
+        for loop, future in self._async_waiters.values():
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # Boucle fermée : l'appelant n'attend plus
+                pass
+
+    def _skip_abandoned(self) -> None:
+        """Fait avancer la file au-delà des tickets abandonnés (sous verrou)"""
+        while self._serving in self._abandoned:
+            self._abandoned.discard(self._serving)
+            self._serving += 1
+
+    def _abandon_ticket(self, ticket: int) -> None:
+        """Retire un ticket non servi de la file (sous verrou)"""
+        if ticket >= self._serving:
+            self._abandoned.add(ticket)
+            self._skip_abandoned()
+            self._notify()
+
+    def _try_acquire(self, ticket: int) -> bool:
+        """Accorde une place au ticket s'il est le premier de la file et qu'une place est libre (sous verrou)"""
+        self._skip_abandoned()
+        if ticket == self._serving and self.inflight < int(self.limit):
+            self._serving += 1
+            self.inflight += 1
+            self._notify()
+            return True
+        return False
+
+    def acquire(self, abandon: Optional[CallAbandon] = None) -> None:
+        """
+        Attend une place (bloquant).
+
+        Args:
+            abandon (Optional[CallAbandon]): Signal interrompant l'attente (TimeoutError)
+        """
+        ticket = self._take_ticket()
+
+        def wake() -> None:
+            with self._condition:
+                self._condition.notify_all()
+
+        if abandon is not None:
+            abandon.on_abandon(wake)
+        try:
+            with self._condition:
+                while True:
+                    if abandon is not None and abandon.abandoned:
+                        self._abandon_ticket(ticket)
+                        abandon.check()
+                    if self._try_acquire(ticket):
+                        return
+                    self._condition.wait()
+        finally:
+            if abandon is not None:
+                abandon.discard(wake)
+
+    async def acquire_async(self) -> None:
+        """Attend une place sans bloquer la boucle d'événements"""
+        ticket = self._take_ticket()
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                with self._condition:
+                    if self._try_acquire(ticket):
+                        return
+                    future = loop.create_future()
+                    self._async_waiters[ticket] = (loop, future)
+                await future
+        except asyncio.CancelledError:
+            # Attente annulée (par exemple appel perdant d'un hedging) : libérer le rang dans la file
+            with self._condition:
+                self._abandon_ticket(ticket)
+            raise
+        finally:
+            with self._condition:
+                self._async_waiters.pop(ticket, None)
+
+    def release(self, latency: float, throttled: bool = False) -> None:
+        """
+        Libère une place et ajuste la limite.
+
+        Args:
+            latency (float): Durée de l'appel (secondes)
+            throttled (bool): True si le fournisseur a refusé l'appel pour quota
+        """
+        with self._condition:
+            self.inflight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit / 2)
+            elif latency > LLM_LATENCY_TARGET:
+                self.limit = max(self.min_limit, self.limit * 0.9)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._notify()
+
+class ProviderLimiter:
+    """Limites d'un fournisseur LLM : requêtes et tokens par minute, concurrence adaptative"""
+
+    def __init__(self, rpm: int = 0, tpm: int = 0, concurrency: int = 4):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.concurrency = AdaptiveConcurrency(concurrency)
+        self.throttled = 0
+
+    def _delay(self, tokens: int) -> float:
+        """Délai imposé par les seaux de requêtes et de tokens"""
+        delay = 0.0
+        if self.requests:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens:
+            delay = max(delay, self.tokens.reserve(tokens))
+        return delay
+
+    @contextmanager
+    def slot(self, tokens: int):
+        """
+        Réserve une place pour un appel (version bloquante) ; le bloc reçoit un dictionnaire
+        où signaler un refus. Si l'appelant abandonne l'appel (voir CallAbandon), la place
+        est libérée sans attendre la fin du bloc.
+        """
+        abandon = _call_abandon.get()
+        self.concurrency.acquire(abandon)
+        outcome = {'throttled': False}
+        started = time.monotonic()
+        released = threading.Event()
+        release_lock = threading.Lock()
+
+        def release() -> None:
+            with release_lock:
+                if released.is_set():
+                    return
+                released.set()
+            self.concurrency.release(time.monotonic() - started, outcome['throttled'])
+
+        if abandon is not None:
+            abandon.on_abandon(release)
+        try:
+            delay = self._delay(tokens)
+            if delay:
+                released.wait(delay)
+            if abandon is not None:
+                abandon.check()
+            started = time.monotonic()
+            yield outcome
+        finally:
+            if abandon is not None:
+                abandon.discard(release)
+            release()
+
+    @asynccontextmanager
+    async def slot_async(self, tokens: int):
+        """Réserve une place pour un appel (version asynchrone)"""
+        await self.concurrency.acquire_async()
+        outcome = {'throttled': False}
+        started = time.monotonic()
+        try:
+            delay = self._delay(tokens)
+            if delay:
+                await asyncio.sleep(delay)
+            started = time.monotonic()
+            yield outcome
+        finally:
+            self.concurrency.release(time.monotonic() - started, outcome['throttled'])
+
+    def stats(self) -> Dict:
+        """Retourne l'état du limiteur"""
+        return {
+            'limit': round(self.concurrency.limit, 2),
+            'inflight': self.concurrency.inflight,
+            'throttled': self.throttled
+        }
+
+_limiters: Dict[str, ProviderLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(name: str) -> ProviderLimiter:
+    """
+    Retourne le limiteur partagé d'un fournisseur.
+
+    Args:
+        name (str): Nom du LLM (clé de llm_configs)
+
+    Returns:
+        ProviderLimiter: Limiteur du fournisseur
+    """
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = ProviderLimiter(**provider_limits.get(name, {}))
+        return _limiters[name]
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Indique si une exception correspond à un refus pour dépassement de quota"""
+    text = f"{type(error).__name__} {error}".lower()
+    return "ratelimit" in text or "rate limit" in text or "429" in text
+
+def _estimate_call_tokens(llm: Any, messages: Any) -> int:
+    """Estimation des tokens consommés par un appel : prompt et réponse attendue"""
+    if isinstance(messages, str):
+        prompt = messages
+    else:
+        prompt = "\n".join(str(message.get("content", "")) for message in messages)
+    return estimate_tokens(prompt) + (getattr(llm, 'max_tokens', None) or LLM_OUTPUT_TOKENS_ESTIMATE)
+
+_call_observer: Optional[Callable[[str, Optional[Exception]], None]] = None
+
+def set_call_observer(observer: Callable[[str, Optional[Exception]], None]) -> None:
+    """
+    Définit la fonction informée du résultat de chaque appel à un fournisseur.
+
+    Args:
+        observer (Callable): Fonction (nom du LLM, exception ou None si l'appel a réussi)
+    """
+    global _call_observer
+    _call_observer = observer
+
+def _observe(name: str, error: Optional[Exception] = None) -> None:
+    """Signale le résultat d'un appel ; un refus pour quota n'est pas une panne et n'est pas signalé"""
+    if _call_observer is not None and (error is None or not is_rate_limit_error(error)):
+        _call_observer(name, error)
+
+class RateLimitedLLMMixin:
+    """
+    Surcharge de call/acall faisant passer chaque appel par le limiteur du fournisseur.
+
+    Le résultat de chaque appel est transmis à l'observateur défini par set_call_observer.
+    """
+
+    rate_limit_provider: ClassVar[str] = ""
+
+    def call(self, messages, *args, **kwargs):
+        limiter = get_limiter(self.rate_limit_provider)
+        tokens = _estimate_call_tokens(self, messages)
+        for attempt in range(LLM_RATE_LIMIT_RETRIES + 1):
+            with limiter.slot(tokens) as outcome:
+                try:
+                    result = super().call(messages, *args, **kwargs)
+                    _observe(self.rate_limit_provider)
+                    return result
+                except Exception as e:
+                    if not is_rate_limit_error(e) or attempt == LLM_RATE_LIMIT_RETRIES:
+                        _observe(self.rate_limit_provider, e)
+                        raise
+                    outcome['throttled'] = True
+                    limiter.throttled += 1
+            time.sleep(2 ** attempt)
+
+    async def acall(self, messages, *args, **kwargs):
+        limiter = get_limiter(self.rate_limit_provider)
+        tokens = _estimate_call_tokens(self, messages)
+        for attempt in range(LLM_RATE_LIMIT_RETRIES + 1):
+            async with limiter.slot_async(tokens) as outcome:
+                try:
+                    result = await super().acall(messages, *args, **kwargs)
+                    _observe(self.rate_limit_provider)
+                    return result
+                except Exception as e:
+                    if not is_rate_limit_error(e) or attempt == LLM_RATE_LIMIT_RETRIES:
+                        _observe(self.rate_limit_provider, e)
+                        raise
+                    outcome['throttled'] = True
+                    limiter.throttled += 1
+            await asyncio.sleep(2 ** attempt)
+
+_limited_classes: Dict[tuple, type] = {}
+
+def with_rate_limit(llm: Any, name: str) -> Any:
+    """
+    Fait passer les appels d'une instance de LLM par le limiteur de son fournisseur.
+
+    Args:
+        llm (LLM): Instance du LLM
+        name (str): Nom du LLM (clé de llm_configs)
+
+    Returns:
+        LLM: La même instance, limitée
+    """
+    cls = type(llm)
+    key = (cls, name)
+    if key not in _limited_classes:
+        _limited_classes[key] = type(
+            f"RateLimited{cls.__name__}",
+            (RateLimitedLLMMixin, cls),
+            {'__annotations__': {'rate_limit_provider': ClassVar[str]}, 'rate_limit_provider': name}
+        )
+    object.__setattr__(llm, '__class__', _limited_classes[key])
+    return llm
+
+def rate_limit_stats() -> Dict[str, Dict]:
+    """Retourne l'état des limiteurs de chaque fournisseur"""
+    with _limiters_lock:
+        return {name: limiter.stats() for name, limiter in _limiters.items()}
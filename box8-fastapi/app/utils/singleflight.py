@@ -0,0 +1,36 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+class SingleFlight:
+    """
+    Regroupe les appels concurrents portant sur une même clé.
+
+    Le premier appelant lance le calcul ; les appelants suivants, tant que ce calcul est
+    en cours, attendent son résultat au lieu d'en lancer un second.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Exécute factory() pour la clé, ou attend l'exécution déjà en cours.
+
+        Args:
+            key (str): Clé identifiant le calcul
+            factory (Callable): Fonction retournant la coroutine à exécuter
+
+        Returns:
+            Any: Résultat du calcul (partagé entre tous les appelants)
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield : l'annulation d'un appelant n'interrompt pas le calcul des autres
+        return await asyncio.shield(task)
+
+    def inflight(self) -> int:
+        """Nombre de calculs en cours"""
+        return len(self._inflight)
@@ -0,0 +1,172 @@
+import os
+import re
+import math
+from typing import List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # Tokenizer local facultatif : repli sur l'heuristique
+    tiktoken = None
+
+# Nombre moyen de caractères par token, calibré sur du texte français avec cl100k_base
+CHARS_PER_TOKEN = float(os.getenv("TOKEN_CHARS_RATIO", "3.5"))
+
+_encodings = {}
+
+def _get_encoding(model: Optional[str]):
+    """Retourne l'encodage tiktoken du modèle (cl100k_base par défaut), ou None si indisponible"""
+    if tiktoken is None:
+        return None
+    name = (model or "").split("/")[-1]
+    if name not in _encodings:
+        try:
+            try:
+                _encodings[name] = tiktoken.encoding_for_model(name)
+            except KeyError:
+                _encodings[name] = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # Encodage introuvable (par exemple hors ligne) : repli sur l'heuristique
+            print(f"Tokenizer indisponible pour {model} : {e}")
+            _encodings[name] = None
+    return _encodings[name]
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estime le nombre de tokens d'un texte.
+
+    Args:
+        text (str): Texte à mesurer
+
+    Returns:
+        int: Nombre de tokens estimé
+    """
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Compte les tokens d'un texte avec le tokenizer local, ou les estime à défaut.
+
+    Args:
+        text (str): Texte à mesurer
+        model (Optional[str]): Nom du modèle (ex. "gpt-4", "mistral/mistral-medium-latest")
+
+    Returns:
+        int: Nombre de tokens
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """
+    Tronque un texte pour qu'il tienne dans un nombre de tokens donné.
+
+    Args:
+        text (str): Texte à tronquer
+        max_tokens (int): Nombre maximal de tokens
+        model (Optional[str]): Modèle dont le tokenizer est utilisé pour compter
+
+    Returns:
+        str: Texte tronqué
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return text[:int(max_tokens * CHARS_PER_TOKEN)]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+def _split_text(text: str, max_tokens: int, model: Optional[str]) -> List[str]:
+    """
+    Découpe un texte trop long en morceaux successifs de max_tokens au plus.
+
+    Chaque ligne n'est comptée qu'une fois : le total du morceau en cours est tenu à jour
+    au lieu d'être recompté à chaque ligne ajoutée.
+    """
+    pieces = []
+    current = ""
+    current_tokens = 0
+    for part in re.split(r"(?<=\n)", text):
+        part_tokens = count_tokens(part, model)
+        if current and current_tokens + part_tokens > max_tokens:
+            pieces.append(current)
+            current, current_tokens = "", 0
+        if current:
+            current += part
+            current_tokens += part_tokens
+            continue
+        # Ligne isolée plus longue que le budget : découpe à la taille en caractères
+        while part_tokens > max_tokens:
+            size = max(1, int(len(part) * max_tokens / part_tokens))
+            while size > 1 and count_tokens(part[:size], model) > max_tokens:
+                size = int(size * 0.95)
+            pieces.append(part[:size])
+            part = part[size:]
+            part_tokens = count_tokens(part, model)
+        current, current_tokens = part, part_tokens
+    if current:
+        pieces.append(current)
+    return pieces
+
+def _tail(text: str, max_tokens: int, model: Optional[str]) -> str:
+    """Derniers caractères d'un texte représentant environ max_tokens tokens"""
+    if max_tokens <= 0 or not text:
+        return ""
+    tokens = count_tokens(text, model)
+    if tokens <= max_tokens:
+        return text
+    return text[-max(1, int(len(text) * max_tokens / tokens)):]
+
+def chunk_texts(texts: List[str], max_tokens: int, overlap_tokens: int = 0, model: Optional[str] = None) -> List[str]:
+    """
+    Regroupe des textes consécutifs (pages) en morceaux d'au plus max_tokens tokens.
+
+    Les pages sont empilées tant qu'elles tiennent dans le budget ; une page plus longue
+    que le budget est découpée. Chaque morceau peut reprendre la fin du précédent.
+
+    Args:
+        texts (List[str]): Textes à regrouper, dans l'ordre
+        max_tokens (int): Budget de tokens d'un morceau
+        overlap_tokens (int): Nombre de tokens repris du morceau précédent
+        model (Optional[str]): Modèle dont le tokenizer est utilisé pour compter
+
+    Returns:
+        List[str]: Morceaux de texte
+    """
+    overlap_tokens = min(overlap_tokens, max_tokens // 4)
+    budget = max(1, max_tokens - overlap_tokens)
+
+    pieces = []
+    for text in texts:
+        if count_tokens(text, model) > budget:
+            pieces.extend(_split_text(text, budget, model))
+        elif text:
+            pieces.append(text)
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for piece in pieces:
+        tokens = count_tokens(piece, model) + 1
+        if current and current_tokens + tokens > budget:
+            chunks.append("\n".join(current))
+            current = []
+            current_tokens = 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n".join(current))
+
+    if overlap_tokens and len(chunks) > 1:
+        chunks = [chunks[0]] + [
+            _tail(previous, overlap_tokens, model) + "\n" + chunk
+            for previous, chunk in zip(chunks, chunks[1:])
+        ]
+    return chunks
@@ -0,0 +1,183 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import chromadb
+from chromadb.config import Settings
+from pydantic import BaseModel, Field
+from crewai_tools.tools.rag.rag_tool import RagTool
+from .hashing import hash_file, hash_text
+from .embeddings import CachedEmbeddingFunction, embedding_service
+
+# Base vectorielle persistante partagée par tous les utilisateurs
+VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "db/")
+# Registre des index de documents (une collection par contenu de document)
+VECTOR_REGISTRY_PATH = os.getenv("VECTOR_REGISTRY_PATH", "cache/vector_index.db")
+# Taille cumulée maximale des documents indexés (octets)
+VECTOR_INDEX_MAX_BYTES = int(os.getenv("VECTOR_INDEX_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+# Durée après laquelle un index inutilisé est supprimé (secondes)
+VECTOR_INDEX_MAX_AGE = int(os.getenv("VECTOR_INDEX_MAX_AGE", str(30 * 24 * 3600)))
+# Un index utilisé récemment n'est jamais évincé (il peut servir à un run en cours)
+VECTOR_INDEX_MIN_IDLE = int(os.getenv("VECTOR_INDEX_MIN_IDLE", "3600"))
+
+# Version du format d'index : à incrémenter si le découpage ou les embeddings changent
+VECTOR_INDEX_VERSION = 1
+
+_registry_lock = threading.Lock()
+_collection_locks: Dict[str, threading.Lock] = {}
+
+class DocumentSearchToolSchema(BaseModel):
+    """Entrée de DocumentSearchTool"""
+
+    query: str = Field(..., description="Mandatory query you want to use to search the document's content")
+
+class DocumentSearchTool(RagTool):
+    """Recherche sémantique dans un document déjà indexé dans sa propre collection"""
+
+    name: str = "Search a document's content"
+    description: str = "A tool that can be used to semantic search a query from a document's content."
+    args_schema: type[BaseModel] = DocumentSearchToolSchema
+
+def vector_db_settings() -> Settings:
+    """Paramètres ChromaDB de la base vectorielle (identiques pour tous les clients du processus)"""
+    return Settings(
+        persist_directory=VECTOR_DB_PATH,
+        is_persistent=True,
+        allow_reset=True,
+        anonymized_telemetry=False
+    )
+
+def vector_db_client() -> chromadb.ClientAPI:
+    """Client ChromaDB de la base vectorielle"""
+    return chromadb.PersistentClient(path=VECTOR_DB_PATH, settings=vector_db_settings())
+
+def rag_config() -> Dict:
+    """Configuration de la base vectorielle transmise aux outils RAG"""
+    return {
+        "vectordb": {
+            "provider": "chromadb",
+            "config": {
+                "settings": vector_db_settings(),
+                "embedding_function": CachedEmbeddingFunction()
+            }
+        }
+    }
+
+@contextmanager
+def _registry():
+    """Gestionnaire de contexte pour les connexions au registre des index"""
+    directory = os.path.dirname(VECTOR_REGISTRY_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    db = sqlite3.connect(VECTOR_REGISTRY_PATH, timeout=30)
+    try:
+        db.execute('''
+        CREATE TABLE IF NOT EXISTS collections (
+            name TEXT PRIMARY KEY,
+            doc_hash TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            accessed REAL NOT NULL
+        )
+        ''')
+        yield db
+    finally:
+        db.close()
+
+def collection_name(doc_hash: str) -> str:
+    """
+    Nom de la collection vectorielle d'un contenu de document pour le modèle d'embedding actuel.
+
+    Args:
+        doc_hash (str): Empreinte du contenu du document
+
+    Returns:
+        str: Nom de collection (compatible ChromaDB)
+    """
+    return f"doc_{hash_text(str(VECTOR_INDEX_VERSION), embedding_service.model_id, doc_hash)[:40]}"
+
+def _delete_collections(names: List[str]) -> None:
+    """Supprime des collections de la base vectorielle et du registre"""
+    if not names:
+        return
+    client = vector_db_client()
+    for name in names:
+        try:
+            client.delete_collection(name)
+        except Exception as e:
+            print(f"Collection {name} introuvable lors de l'éviction : {e}")
+    with _registry_lock, _registry() as db:
+        db.executemany('DELETE FROM collections WHERE name = ?', [(name,) for name in names])
+        db.commit()
+
+def evict_indexes(keep: Optional[str] = None) -> List[str]:
+    """
+    Supprime les index trop anciens, puis les moins récemment utilisés au-delà de la taille maximale.
+
+    Args:
+        keep (Optional[str]): Collection à ne jamais supprimer
+
+    Returns:
+        List[str]: Collections supprimées
+    """
+    now = time.time()
+    with _registry() as db:
+        rows = db.execute('SELECT name, size, accessed FROM collections ORDER BY accessed ASC').fetchall()
+    total = sum(size for _, size, _ in rows)
+    evicted = []
+    for name, size, accessed in rows:
+        if name == keep or now - accessed < VECTOR_INDEX_MIN_IDLE:
+            continue
+        if now - accessed > VECTOR_INDEX_MAX_AGE or total > VECTOR_INDEX_MAX_BYTES:
+            evicted.append(name)
+            total -= size
+    _delete_collections(evicted)
+    if evicted:
+        print(f"Index vectoriels évincés : {len(evicted)}")
+    return evicted
+
+def get_document_tool(src: str) -> DocumentSearchTool:
+    """
+    Retourne un outil de recherche sur un document, en réutilisant son index s'il existe.
+
+    Le document n'est découpé et vectorisé que lors de sa première utilisation : l'index
+    est identifié par le contenu du fichier et partagé entre runs et utilisateurs.
+
+    Args:
+        src (str): Chemin du document
+
+    Returns:
+        DocumentSearchTool: Outil RAG limité à la collection du document
+    """
+    doc_hash = hash_file(src)
+    name = collection_name(doc_hash)
+    with _registry_lock:
+        lock = _collection_locks.setdefault(name, threading.Lock())
+
+    # Un seul thread indexe un document donné ; les autres attendent puis réutilisent l'index
+    with lock:
+        tool = DocumentSearchTool(
+            collection_name=name,
+            config=rag_config(),
+            description=f"A tool that can be used to semantic search a query the {os.path.basename(src)} document's content."
+        )
+        now = time.time()
+        with _registry() as db:
+            indexed = db.execute('SELECT 1 FROM collections WHERE name = ?', (name,)).fetchone()
+        if indexed:
+            print(f"Index vectoriel réutilisé pour {src}")
+        else:
+            print(f"Indexation de {src}")
+            tool.add(src)
+        with _registry_lock, _registry() as db:
+            db.execute(
+                'INSERT INTO collections (name, doc_hash, size, created, accessed) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET accessed = excluded.accessed',
+                (name, doc_hash, os.path.getsize(src), now, now)
+            )
+            db.commit()
+
+    evict_indexes(keep=name)
+    return tool
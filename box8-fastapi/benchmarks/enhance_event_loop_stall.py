@@ -0,0 +1,109 @@
+"""
+Mesure du blocage de la boucle d'événements pendant une modification de diagramme.
+
+Une coroutine « battement » se réveille toutes les INTERVAL secondes et mesure son retard
+pendant que enhance_diagram_from_description s'exécute. Le LLM est remplacé par un modèle
+factice dont chaque appel dure --latency secondes : la mesure ne dépend ni du réseau ni
+d'une clé d'API.
+
+Usage (depuis box8-fastapi/) :
+    python benchmarks/enhance_event_loop_stall.py [--latency 2] [--runs 3] [--max-stall 0.1]
+
+Le script se termine en erreur si le retard maximal dépasse --max-stall, ou si le patch
+renvoyé par le LLM n'a pas été appliqué.
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import statistics
+
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crewai.llms.base_llm import BaseLLM
+from app.services import diagram_service
+
+# Période du battement mesurant le retard de la boucle (secondes)
+INTERVAL = 0.01
+
+# Patch renvoyé par le LLM factice
+PATCH = [{"op": "update_node", "key": "writer", "fields": {"goal": "Rédiger un rapport plus court"}}]
+
+DIAGRAM = {
+    "name": "benchmark",
+    "nodes": [
+        {"key": "researcher", "type": "agent", "role": "Chercheur", "goal": "Collecter les sources", "backstory": ""},
+        {"key": "writer", "type": "agent", "role": "Rédacteur", "goal": "Rédiger un rapport", "backstory": ""},
+        {"key": "output", "type": "output", "role": "output", "goal": "", "backstory": ""}
+    ],
+    "links": [
+        {"id": "l1", "from": "researcher", "to": "writer", "description": "Transmettre les sources", "expected_output": "Sources"},
+        {"id": "l2", "from": "writer", "to": "output", "description": "Rapport final", "expected_output": "Rapport"}
+    ]
+}
+
+class SlowLLM(BaseLLM):
+    """LLM factice : attend `latency` secondes (appel réseau simulé) puis renvoie un patch"""
+
+    latency: float = 2.0
+
+    def call(self, messages, *args, **kwargs):
+        time.sleep(self.latency)
+        return "Thought: I now know the final answer\nFinal Answer: ```json\n" + json.dumps(PATCH) + "\n```"
+
+async def heartbeat(lags: list, stop: asyncio.Event) -> None:
+    """Enregistre le retard de chaque réveil par rapport à l'instant prévu"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + INTERVAL
+        await asyncio.sleep(INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+async def measure(latency: float) -> dict:
+    """Exécute une modification de diagramme et retourne les retards observés"""
+    llm = SlowLLM(model="benchmark", latency=latency)
+    diagram_service.choose_llm = lambda name="": llm
+
+    lags: list = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(lags, stop))
+    await asyncio.sleep(INTERVAL * 5)
+    started = time.perf_counter()
+    result = await diagram_service.enhance_diagram_from_description(DIAGRAM, "Raccourcir le rapport", "benchmark")
+    duration = time.perf_counter() - started
+    stop.set()
+    await beat
+    applied = next(node for node in result["nodes"] if node["key"] == "writer")["goal"] == PATCH[0]["fields"]["goal"]
+    return {"duration": duration, "lags": lags, "applied": applied}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=2.0, help="durée simulée d'un appel LLM (secondes)")
+    parser.add_argument("--runs", type=int, default=3, help="nombre de modifications mesurées")
+    parser.add_argument("--max-stall", type=float, default=0.1, help="retard maximal toléré de la boucle (secondes)")
+    args = parser.parse_args()
+
+    worst = 0.0
+    applied = True
+    for run in range(args.runs):
+        stats = asyncio.run(measure(args.latency))
+        applied = applied and stats["applied"]
+        lags = sorted(stats["lags"])
+        stall = lags[-1] if lags else stats["duration"]
+        worst = max(worst, stall)
+        p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else stats["duration"]
+        print(
+            f"run {run + 1}: durée {stats['duration']:.2f}s, {len(lags)} battements, "
+            f"retard médian {statistics.median(lags) * 1000 if lags else 0:.1f} ms, "
+            f"p99 {p99 * 1000:.1f} ms, max {stall * 1000:.1f} ms, patch appliqué : {stats['applied']}"
+        )
+
+    print(f"retard maximal de la boucle : {worst * 1000:.1f} ms (seuil {args.max_stall * 1000:.0f} ms)")
+    return 0 if worst <= args.max_stall and applied else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
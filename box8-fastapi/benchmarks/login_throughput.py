@@ -0,0 +1,101 @@
+"""
+Débit et latence des connexions (/auth/login) sous concurrence.
+
+Les routes d'authentification sont servies en mémoire (httpx, transport ASGI) sur une
+base d'utilisateurs temporaire : la mesure porte sur la vérification bcrypt et la
+boucle d'événements, sans réseau. Une coroutine « battement » mesure en parallèle le
+retard de la boucle pendant la rafale.
+
+Usage (depuis box8-fastapi/, httpx requis) :
+    python benchmarks/login_throughput.py [--requests 200] [--concurrency 50]
+
+Affiche les latences p50/p99, le débit, le nombre de refus pour surcharge (503) et le
+retard maximal de la boucle d'événements.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+from app.database import database
+from app.auth.auth import get_password_hash, PASSWORD_WORKERS, PASSWORD_QUEUE_MAX
+from app.routes.auth import router as auth_router
+
+EMAIL = "benchmark@example.com"
+PASSWORD = "benchmark-password"
+
+def setup_database(directory: str) -> None:
+    """Crée une base temporaire contenant un utilisateur actif"""
+    database.DATABASE_PATH = Path(directory) / "users.db"
+    database.init_db()
+    database.create_user({
+        "id": "benchmark",
+        "username": "benchmark",
+        "email": EMAIL,
+        "hashed_password": get_password_hash(PASSWORD),
+        "is_active": True
+    })
+
+def percentile(values: list, fraction: float) -> float:
+    """Percentile d'une liste triée"""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+async def run(requests: int, concurrency: int) -> None:
+    app = FastAPI()
+    app.include_router(auth_router, prefix="/auth")
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    statuses = {}
+    lags = []
+    semaphore = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+
+    async def heartbeat() -> None:
+        loop = asyncio.get_running_loop()
+        while not stop.is_set():
+            expected = loop.time() + 0.01
+            await asyncio.sleep(0.01)
+            lags.append(max(0.0, loop.time() - expected))
+
+    async def login(client: httpx.AsyncClient) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/auth/login", json={"email": EMAIL, "password": PASSWORD})
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    beat = asyncio.create_task(heartbeat())
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*[login(client) for _ in range(requests)])
+        duration = time.perf_counter() - started
+    stop.set()
+    await beat
+
+    latencies.sort()
+    print(f"{requests} connexions, concurrence {concurrency}, "
+          f"{PASSWORD_WORKERS} threads bcrypt, file max {PASSWORD_QUEUE_MAX}")
+    print(f"statuts : {dict(sorted(statuses.items()))}")
+    print(f"latence p50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+    print(f"débit {requests / duration:.1f} connexions/s ({duration:.2f}s)")
+    print(f"retard maximal de la boucle : {max(lags, default=0.0) * 1000:.1f} ms")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="nombre de connexions")
+    parser.add_argument("--concurrency", type=int, default=50, help="connexions simultanées")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        setup_database(directory)
+        asyncio.run(run(args.requests, args.concurrency))
+
+if __name__ == "__main__":
+    main()
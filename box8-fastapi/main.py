@@ -2,11 +2,12 @@ from fastapi import FastAPI, Request, HTTPException, UploadFile, File, Response,
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, FileResponse
 from app.routes.auth import router as auth_router
-from app.auth.auth import get_current_user, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.auth.auth import get_current_user, create_access_token, session_needs_renewal, ACCESS_TOKEN_EXPIRE_MINUTES
 from app.routes.admin import router as admin_router
 from app.websocket.manager import manager
 import json
 import os
+import asyncio
 from pydantic import BaseModel
 from typing import List, Optional
 from app.services.diagram_service import (execute_process_from_diagram, 
@@ -14,9 +15,18 @@ from app.services.diagram_service import (execute_process_from_diagram,
                                         ask_process_from_diagram,
                                         enhance_diagram_from_description,
                                         crewai_summarize)
+from app.services.summary_service import lookup_summary, import_legacy_summary
+from app.utils.hashing import hash_file
+from app.utils.pdf_utils import shutdown_extraction_pool
+from app.utils.page_cache import invalidate_page_cache
 import aiofiles
 from datetime import timedelta
-from app.utils.crewai_functions import choose_llm, llm_configs
+from app.utils.crewai_functions import choose_llm, llm_configs, llm_health_monitor
+from app.utils.llm_cache import response_cache_stats
+from app.utils.rate_limiter import rate_limit_stats
+from app.utils.hedging import hedging_stats
+from app.services.job_service import job_manager, JobRejected
+from app.services.scheduler import DIAGRAM_MAX_CONCURRENCY
 
 MAGENTA = "\033[95m"
 RED = "\033[91m"
@@ -46,6 +56,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def start_job_workers():
+    """Démarre les workers de la file d'attente des runs et la vérification des LLMs"""
+    await job_manager.start()
+    await llm_health_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    """Arrête les workers de la file d'attente des runs et la vérification des LLMs"""
+    await job_manager.stop()
+    await llm_health_monitor.stop()
+    shutdown_extraction_pool()
+
 # WebSocket connection manager
 @app.websocket("/ws/diagram")
 async def websocket_endpoint(websocket: WebSocket):
@@ -71,13 +94,13 @@ async def websocket_endpoint(websocket: WebSocket):
 async def extend_session_middleware(request: Request, call_next):
     response = await call_next(request)
     
-    # Récupérer le cookie de session
+    # Récupérer le cookie de session : il n'est renouvelé qu'au-delà de SESSION_RENEW_FRACTION de sa durée de vie
     session = request.cookies.get("session")
-    if session:
+    if session and session_needs_renewal(session):
         # Créer un nouveau token avec une durée prolongée
         try:
-            # Vérifier si l'utilisateur est valide
-            user = await get_current_user(session)
+            # Vérifier si l'utilisateur est valide (déjà fait par la route le cas échéant)
+            user = getattr(request.state, "user", None) or await get_current_user(session, request)
             if user:
                 access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
                 access_token = create_access_token(
@@ -175,7 +198,7 @@ async def save_diagram(request: Request, data: DiagramSave):
     if not session:
         raise HTTPException(status_code=401, detail="Non authentifié")
     
-    user = await get_current_user(session)
+    user = await get_current_user(session, request)
     if not user:
         raise HTTPException(status_code=401, detail="Session invalide")
     
@@ -213,12 +236,12 @@ async def designer_delete_diagram(filename: str):
 
 @app.post("/designer/launch-crewai")
 async def designer_launch_crewai(request: Request):
-    """Lance le processus CrewAI à partir d'un diagramme"""
+    """Place l'exécution CrewAI d'un diagramme dans la file d'attente et retourne son identifiant"""
     session = request.cookies.get("session")
     if not session:
         raise HTTPException(status_code=401, detail="Non authentifié")
     
-    user = await get_current_user(session)
+    user = await get_current_user(session, request)
     if not user:
         raise HTTPException(status_code=401, detail="Session invalide")
 
@@ -233,16 +256,54 @@ async def designer_launch_crewai(request: Request):
         if not os.path.exists(user_folder):
             os.makedirs(user_folder)
             
-        result = await execute_process_from_diagram(data, folder=user_folder, llm=llm)
-        if not chat_input=='': 
-            chat = await ask_process_from_diagram(chat_input, result["message"], llm)
-            print(f"Chat renvoyé: {chat}")
-            result["message"] += chat
-
-        return JSONResponse(result)
+        # Nombre de nœuds simultanés demandé par le client, borné par DIAGRAM_MAX_CONCURRENCY
+        max_concurrency = data.get('maxConcurrency')
+        if max_concurrency is not None:
+            try:
+                if isinstance(max_concurrency, bool):
+                    raise ValueError
+                max_concurrency = int(max_concurrency)
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="maxConcurrency doit être un entier positif")
+            if max_concurrency < 1:
+                raise HTTPException(status_code=400, detail="maxConcurrency doit être un entier positif")
+            max_concurrency = min(max_concurrency, DIAGRAM_MAX_CONCURRENCY)
+        use_cache = data.get('useCache', True)
+        incremental = data.get('incremental', True)
+
+        async def run() -> dict:
+            result = await execute_process_from_diagram(data, folder=user_folder, llm=llm, max_concurrency=max_concurrency, use_cache=use_cache, incremental=incremental)
+            if not chat_input=='': 
+                chat = await ask_process_from_diagram(chat_input, result["message"], llm)
+                print(f"Chat renvoyé: {chat}")
+                result["message"] += chat
+            return result
+
+        job = await job_manager.submit(user["email"], run)
+        return JSONResponse(job, status_code=202)
+    except HTTPException:
+        raise
+    except JobRejected as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/designer/runs/{run_id}")
+async def designer_get_run(request: Request, run_id: str):
+    """Récupère le statut et, une fois terminé, le résultat d'un run"""
+    session = request.cookies.get("session")
+    if not session:
+        raise HTTPException(status_code=401, detail="Non authentifié")
+    
+    user = await get_current_user(session, request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Session invalide")
+
+    job = job_manager.get(run_id)
+    if not job or job["user"] != user["email"]:
+        raise HTTPException(status_code=404, detail="Run non trouvé")
+    return JSONResponse(job_manager.describe(job))
+
 
 @app.post("/designer/generate-diagram")
 async def generate_diagram(request: Request, data: DiagramDescription):
@@ -251,7 +312,7 @@ async def generate_diagram(request: Request, data: DiagramDescription):
     if not session:
         raise HTTPException(status_code=401, detail="Non authentifié")
     
-    user = await get_current_user(session)
+    user = await get_current_user(session, request)
     if not user:
         raise HTTPException(status_code=401, detail="Session invalide")
     
@@ -271,7 +332,7 @@ async def enhance_diagram(request: Request):
     if not session:
         raise HTTPException(status_code=401, detail="Non authentifié")
     
-    user = await get_current_user(session)
+    user = await get_current_user(session, request)
     if not user:
         raise HTTPException(status_code=401, detail="Session invalide")
     
@@ -294,7 +355,7 @@ async def get_user_files(request: Request):
     if not session:
         raise HTTPException(status_code=401, detail="Non authentifié")
     
-    user = await get_current_user(session)
+    user = await get_current_user(session, request)
     if not user:
         raise HTTPException(status_code=401, detail="Session invalide")
     
@@ -320,7 +381,7 @@ async def upload_user_file(request: Request, file: UploadFile = File(...)):
     if not session:
         raise HTTPException(status_code=401, detail="Non authentifié")
     
-    user = await get_current_user(session)
+    user = await get_current_user(session, request)
     if not user:
         raise HTTPException(status_code=401, detail="Session invalide")
     
@@ -337,6 +398,8 @@ async def upload_user_file(request: Request, file: UploadFile = File(...)):
         # Écriture asynchrone du fichier
         async with aiofiles.open(file_path, 'wb') as f:
             await f.write(content)
+        # Le texte extrait de l'ancienne version du fichier n'est plus valable
+        invalidate_page_cache(file_path)
         
         return {"message": f"Fichier {file.filename} uploadé avec succès"}
     except Exception as e:
@@ -349,7 +412,7 @@ async def delete_user_file(request: Request, filename: str):
     if not session:
         raise HTTPException(status_code=401, detail="Non authentifié")
     
-    user = await get_current_user(session)
+    user = await get_current_user(session, request)
     if not user:
         raise HTTPException(status_code=401, detail="Session invalide")
     
@@ -361,6 +424,7 @@ async def delete_user_file(request: Request, filename: str):
     
     try: 
         os.remove(file_path)
+        invalidate_page_cache(file_path)
         txt_file_path = file_path + ".txt"
         if os.path.exists(txt_file_path):
             os.remove(txt_file_path)
@@ -376,7 +440,7 @@ async def get_user_file(request: Request, filename: str):
     if not session:
         raise HTTPException(status_code=401, detail="Non authentifié")
     
-    user = await get_current_user(session)
+    user = await get_current_user(session, request)
     if not user:
         raise HTTPException(status_code=401, detail="Session invalide")
     
@@ -402,7 +466,7 @@ async def set_llm(request: Request, llm_data: LLMSelection):
     if not session:
         raise HTTPException(status_code=401, detail="Non authentifié")
     
-    user = await get_current_user(session)
+    user = await get_current_user(session, request)
     if not user:
         raise HTTPException(status_code=401, detail="Session invalide")
     
@@ -446,7 +510,7 @@ async def summarize_file(request: Request, filename: str):
         # print(f"{RED}[SUMMARY] No session cookie found{END}")
         raise HTTPException(status_code=401, detail="Non authentifié")
         
-    user = await get_current_user(session)
+    user = await get_current_user(session, request)
     if not user:
         # print(f"{RED}[SUMMARY] Authentication failed{END}")
         raise HTTPException(status_code=401, detail="Non authentifié")
@@ -479,7 +543,7 @@ async def get_summary_file(request: Request, filename: str):
         # print(f"{RED}[GET SUMMARY] No session cookie found{END}")
         raise HTTPException(status_code=401, detail="Non authentifié")
         
-    user = await get_current_user(session)
+    user = await get_current_user(session, request)
     if not user:
         # print(f"{RED}[GET SUMMARY] Authentication failed{END}")
         raise HTTPException(status_code=401, detail="Non authentifié")
@@ -487,19 +551,18 @@ async def get_summary_file(request: Request, filename: str):
     # print(f"{GREEN}[GET SUMMARY] User authenticated: {user['email']}{END}")
     user_folder = get_user_folder(user["email"])
     file_path = os.path.join(user_folder, filename)
-    summary_path = f"{file_path}.txt"
     
-    # print(f"{GREEN}[GET SUMMARY] Summary path: {summary_path}{END}")
-    
-    if not os.path.exists(summary_path):
-       #  print(f"{RED}[GET SUMMARY] Summary file not found: {summary_path}{END}")
+    if not os.path.exists(file_path):
         return {"has_summary": False, "summary": None}
     
     try:
-        async with aiofiles.open(summary_path, 'r', encoding='utf-8') as file:
-            content = await file.read()
-           #  print(f"{GREEN}[GET SUMMARY] Summary file read successfully{END}")
-            return {"has_summary": True, "summary": content}
+        doc_hash = await asyncio.to_thread(hash_file, file_path)
+        summary = await asyncio.to_thread(lookup_summary, doc_hash)
+        if summary is None:
+            summary = await asyncio.to_thread(import_legacy_summary, file_path, doc_hash)
+        if summary is None:
+            return {"has_summary": False, "summary": None}
+        return {"has_summary": True, "summary": summary}
     except Exception as e:
         # print(f"{RED}[GET SUMMARY] Error reading summary file: {str(e)}{END}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -507,7 +570,13 @@ async def get_summary_file(request: Request, filename: str):
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "llms": llm_health_monitor.snapshot(),
+        "llm_cache": response_cache_stats(),
+        "rate_limits": rate_limit_stats(),
+        "hedging": hedging_stats()
+    }
 
 # Route de test
 @app.get("/")
@@ -491,6 +491,49 @@ function Flow() {
     }
   }, [setEdges, setNodes, setCurrentDiagramName, setCurrentDiagramDescription]); // No dependencies needed since we only use setState functions which are stable
 
+  // Attend la fin d'un run placé en file d'attente et retourne son résultat.
+  // Les erreurs passagères (404, 429, 5xx, réseau) sont tolérées quelques fois de suite,
+  // et l'attente est abandonnée au-delà de RUN_MAX_WAIT_MS.
+  const RUN_POLL_INTERVAL_MS = 2000;
+  const RUN_MAX_WAIT_MS = 30 * 60 * 1000;
+  const RUN_MAX_RETRIES = 5;
+  const waitForRun = async (runId) => {
+    const deadline = Date.now() + RUN_MAX_WAIT_MS;
+    let failures = 0;
+    while (true) {
+      if (Date.now() > deadline) {
+        throw new Error('Run timed out');
+      }
+      await new Promise(resolve => setTimeout(resolve, RUN_POLL_INTERVAL_MS * Math.min(2 ** failures, 8)));
+      let response;
+      try {
+        response = await fetch(`http://localhost:8000/designer/runs/${runId}`, {
+          credentials: 'include'
+        });
+      } catch (error) {
+        if (++failures > RUN_MAX_RETRIES) {
+          throw error;
+        }
+        continue;
+      }
+      if (!response.ok) {
+        const transient = response.status === 404 || response.status === 429 || response.status >= 500;
+        if (transient && ++failures <= RUN_MAX_RETRIES) {
+          continue;
+        }
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      failures = 0;
+      const job = await response.json();
+      if (job.status === 'success') {
+        return job.result;
+      }
+      if (job.status === 'error') {
+        return { status: 'error', message: job.error };
+      }
+    }
+  };
+
   const handleCreateCrewAI = useCallback((chatInput) => {
     setIsCreatingCrewAI(true);
     // Récupérer les données du diagramme
@@ -515,6 +558,7 @@ function Flow() {
         expected_output: edge.data?.expected_output,
         relationship: edge.data?.relationship
       })),
+      name: currentDiagramName,
       chatInput: chatInput
     };
     
@@ -536,6 +580,7 @@ function Flow() {
       }
       return response.json();
     })
+    .then(job => waitForRun(job.run_id))
     .then(data => {
       console.log(data);
       if (data.status === 'success') {
@@ -556,7 +601,7 @@ function Flow() {
     .finally(() => {
       setIsCreatingCrewAI(false);
     });
-  }, [nodes, edges]);
+  }, [nodes, edges, currentDiagramName]);
 
   const handleEnhanceDiagram = useCallback((chatInput) => {
     setIsCreatingCrewAI(true);